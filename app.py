@@ -1,14 +1,23 @@
 # app.py
 
-from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify
+from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, g
+from markupsafe import Markup
 from functools import wraps
-from datetime import datetime
+from datetime import datetime, timedelta
 import db_functions as db
+import bestsellers
+import metrics
+import session_store
+import hashlib
 import json
-import jwt
+import re
 
 app = Flask(__name__)
 app.secret_key = 'bu_juda_maxfiy_kalit_!@#$%'
+sessions, user_cache = session_store.init_app(app)
+metrics.init_app(app)
+metrics.instrument_module(db)
+bestsellers.init_app(app)
 
 # --- Maxsus Jinja2 filtri pul formatlash uchun ---
 def format_currency(value):
@@ -20,11 +29,47 @@ def format_currency(value):
 
 app.jinja_env.filters['format_currency'] = format_currency
 
+# --- Ro'yxat jadvallari uchun fragment keshi ---
+# Kalit - shablon va uning ma'lumotlari xeshi: sahifa o'zgarmagan bo'lsa, Jinja qayta ishlamaydi
+FRAGMENT_CACHE_SIZE = 128
+_fragment_cache = session_store.LRUCache(FRAGMENT_CACHE_SIZE)
+
+def render_cached_fragment(template_name, **context):
+    key = (template_name, hashlib.sha1(repr(sorted(context.items())).encode()).hexdigest())
+    html = _fragment_cache.get(key)
+    if html is None:
+        html = Markup(render_template(template_name, **context))
+        _fragment_cache.set(key, html)
+    return html
+
+def list_page_args():
+    return {
+        'sort': request.args.get('sort', 'id'),
+        'direction': request.args.get('direction', 'desc'),
+        'after': request.args.get('after'),
+        'before': request.args.get('before'),
+    }
+
+# --- Joriy foydalanuvchi: sessiyada faqat id, qolgani xotiradagi keshdan ---
+@app.before_request
+def load_current_user():
+    with metrics.phase('auth'):
+        user_id = session.get('user_id')
+        g.user, available = user_cache.lookup(user_id) if user_id else (None, True)
+        if user_id and g.user is None and available:
+            # O'chirilgan yoki faolsizlantirilgan foydalanuvchi darhol tizimdan chiqariladi.
+            # Baza vaqtincha ishlamasa sessiya saqlanadi: so'rov login sahifasiga yo'naltiriladi, xolos
+            session.pop('user_id', None)
+
+def log_in_user(user_id):
+    session_store.rotate_session(session, sessions)
+    session['user_id'] = user_id
+
 # --- Dekoratorlar (Foydalanuvchi huquqlarini tekshirish uchun) ---
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if 'user' not in session:
+        if g.user is None:
             return redirect(url_for('login'))
         return f(*args, **kwargs)
     return decorated_function
@@ -33,27 +78,34 @@ def role_required(role_name):
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
-            if 'user' not in session:
+            if g.user is None:
                 return redirect(url_for('login'))
             
-            user_role = session['user']['role']
-            # Admin hamma sahifaga kira oladi
-            if user_role == 'admin':
-                return f(*args, **kwargs)
-            
-            allowed_roles = role_name if isinstance(role_name, list) else [role_name]
-            if user_role not in allowed_roles:
+            with metrics.phase('auth'):
+                user_role = g.user['role']
+                # Admin hamma sahifaga kira oladi
+                allowed_roles = role_name if isinstance(role_name, list) else [role_name]
+                allowed = user_role == 'admin' or user_role in allowed_roles
+            if not allowed:
                 flash("Bu sahifaga kirish uchun sizda ruxsat yo'q.", "warning")
                 return redirect(url_for('home'))
             return f(*args, **kwargs)
         return decorated_function
     return decorator
 
+def current_location_id():
+    # Kassa/ombor xodimi biriktirilgan joylashuv; biriktirilmagan bo'lsa roli bo'yicha asosiy do'kon yoki ombor
+    return g.user.get('location_id') or db.default_location_for_role(g.user['role'])
+
+def form_location_id():
+    location_id = request.form.get('location_id')
+    return int(location_id) if location_id else current_location_id()
+
 # --- Asosiy va Autentifikatsiya ---
 @app.route('/')
 @login_required
 def home():
-    role = session['user']['role']
+    role = g.user['role']
     if role == 'admin': return redirect(url_for('admin_dashboard'))
     if role == 'cashier': return redirect(url_for('cashier_dashboard'))
     if role == 'warehouse': return redirect(url_for('warehouse_dashboard'))
@@ -64,7 +116,7 @@ def login():
     if request.method == 'POST':
         user = db.check_user_credentials(request.form['username'], request.form['password'])
         if user:
-            session['user'] = user
+            log_in_user(user['id'])
             return redirect(url_for('home'))
         else:
             flash('Login yoki parol noto\'g\'ri!', 'danger')
@@ -72,7 +124,7 @@ def login():
 
 @app.route('/logout')
 def logout():
-    session.pop('user', None)
+    session.clear()
     flash('Tizimdan muvaffaqiyatli chiqdingiz.', 'info')
     return redirect(url_for('login'))
 
@@ -82,12 +134,13 @@ def qr_login():
     token = request.form.get('token')
     if not token:
         return jsonify({'status': 'error', 'message': 'Token topilmadi.'})
+    import jwt
     try:
         payload = jwt.decode(token, app.secret_key, algorithms=['HS256'])
         user_id = payload['sub']
-        user = db.get_user_by_id(user_id)
+        user = db.get_user_auth(user_id)
         if user and user['is_active']:
-            session['user'] = user
+            log_in_user(user['id'])
             return jsonify({'status': 'success', 'redirect_url': url_for('home')})
         else:
             return jsonify({'status': 'error', 'message': 'Foydalanuvchi topilmadi yoki faol emas.'})
@@ -99,17 +152,54 @@ def qr_login():
 @login_required
 @role_required('admin')
 def admin_dashboard():
-    analytics_data = db.get_analytics_data(days=30)
+    analytics_data = db.get_analytics_data(days=30, top_products=bestsellers.top_products(days=30, limit=5, active_only=False))
     return render_template('admin_dashboard.html', **analytics_data)
 
+def _parse_analytics_moment(value, is_end=False):
+    # 'YYYY-MM-DD' (oxirgi kun ham kiradi) yoki 'YYYY-MM-DDTHH:MM'
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is not None:
+        # Bazadagi vaqtlar mahalliy (vaqt zonasisiz) saqlanadi
+        raise ValueError("Vaqt zonasi ko'rsatilgan sana qabul qilinmaydi")
+    if is_end and 'T' not in value and ' ' not in value:
+        moment += timedelta(days=1)
+    return moment
+
+@app.route('/api/analytics')
+@login_required
+@role_required('admin')
+def analytics_api():
+    try:
+        if request.args.get('end'):
+            end = _parse_analytics_moment(request.args['end'], is_end=True)
+        else:
+            end = datetime.combine(datetime.today(), datetime.min.time()) + timedelta(days=1)
+        if request.args.get('start'):
+            start = _parse_analytics_moment(request.args['start'])
+        else:
+            start = end - timedelta(days=request.args.get('days', 30, type=int))
+        series = db.get_analytics_series(start, end, request.args.get('bucket'))
+    except (ValueError, OverflowError):
+        return jsonify({'status': 'error', 'message': "Sana oralig'i noto'g'ri."}), 400
+    if series is None:
+        return jsonify({'status': 'error', 'message': 'Baza bilan ulanishda xato.'}), 503
+    series['start'], series['end'] = start.isoformat(), end.isoformat()
+    response = jsonify(series)
+    # Ma'lumot o'zgarmagan bo'lsa brauzer 304 oladi va qayta yuklamaydi
+    response.set_etag(hashlib.sha1(response.get_data()).hexdigest())
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
+
 # --- Mijozlarni Boshqarish ---
 @app.route('/customers')
 @login_required
 @role_required('admin')
 def customers_page():
     search_term = request.args.get('q', '')
-    customers = db.view_customers(search_term)
-    return render_template('customers.html', customers=customers, search_term=search_term)
+    page = db.list_customers_page(search_term, **list_page_args())
+    list_args = {'q': search_term, 'sort': page['sort'], 'direction': page['direction']}
+    table_html = render_cached_fragment('_customers_table.html', page=page, list_args=list_args)
+    return render_template('customers.html', table_html=table_html, search_term=search_term)
 
 @app.route('/customers/add', methods=['GET', 'POST'])
 @login_required
@@ -135,7 +225,42 @@ def edit_customer_page(customer_id):
         return redirect(url_for('customers_page'))
     
     customer = db.get_customer_by_id(customer_id)
-    return render_template('customer_form.html', title="Mijozni Tahrirlash", customer=customer)
+    return render_template('customer_form.html', title="Mijozni Tahrirlash", customer=customer,
+                           loyalty_balance=db.get_loyalty_balance(customer_id),
+                           loyalty_history=db.get_loyalty_history(customer_id))
+
+# --- Sodiqlik Ballari ---
+@app.route('/customers/<int:customer_id>/loyalty')
+@login_required
+@role_required(['cashier', 'admin'])
+def customer_loyalty_api(customer_id):
+    balance = db.get_loyalty_balance(customer_id)
+    return jsonify({'customer_id': customer_id, 'balance': balance, 'point_value': db.LOYALTY_POINT_VALUE})
+
+@app.route('/customers/<int:customer_id>/loyalty/adjust', methods=['POST'])
+@login_required
+@role_required('admin')
+def adjust_loyalty_route(customer_id):
+    try:
+        points = int(request.form['points'])
+        success, message = db.adjust_loyalty_points(customer_id, points, g.user['id'], request.form.get('notes', ''))
+        flash(message, 'success' if success else 'danger')
+    except (ValueError, TypeError):
+        flash("Noto'g'ri ma'lumot kiritildi.", "danger")
+    return redirect(url_for('edit_customer_page', customer_id=customer_id))
+
+@app.route('/loyalty/maintenance', methods=['POST'])
+@login_required
+@role_required('admin')
+def loyalty_maintenance_route():
+    try:
+        days = int(request.form.get('expire_days', 365))
+    except ValueError:
+        days = 365
+    expired = db.expire_loyalty_points(older_than_days=days)
+    compacted = db.compact_loyalty_balances()
+    flash(f"Bonus ballari yangilandi: {expired} mijozda muddati o'tgan ballar o'chirildi, {compacted} balans siqildi.", "success")
+    return redirect(url_for('customers_page'))
 
 # --- Xarajatlarni Boshqarish ---
 @app.route('/expenses', methods=['GET', 'POST'])
@@ -148,7 +273,7 @@ def expenses_page():
     
     if request.method == 'POST':
         if 'description' in request.form:
-            db.add_expense(request.form['description'], request.form['amount'], request.form['expense_date'], session['user']['id'])
+            db.add_expense(request.form['description'], request.form['amount'], request.form['expense_date'], g.user['id'])
             flash("Xarajat muvaffaqiyatli qo'shildi!", "success")
             return redirect(url_for('expenses_page'))
         else:
@@ -169,7 +294,7 @@ def expenses_page():
 @role_required(['cashier', 'admin'])
 def cashier_dashboard():
     return render_template('cashier_dashboard.html', 
-                           products=db.view_products(),
+                           products=db.view_products(location_id=current_location_id()),
                            customers=db.view_customers())
 
 @app.route('/cashier/sell', methods=['POST'])
@@ -180,9 +305,10 @@ def sell_product():
         product_id = int(request.form['product_id'])
         quantity = int(request.form['quantity'])
         customer_id = request.form.get('customer_id')
-        user_id = session['user']['id']
+        redeem_points = int(request.form.get('redeem_points') or 0)
+        user_id = g.user['id']
         
-        success, message, sale_id = db.process_sale(product_id, quantity, user_id, customer_id if customer_id else None)
+        success, message, sale_id = db.process_sale(product_id, quantity, user_id, customer_id if customer_id else None, max(redeem_points, 0), current_location_id())
         
         if success:
             receipt_url = url_for('receipt_page', sale_id=sale_id)
@@ -193,6 +319,18 @@ def sell_product():
     except (ValueError, TypeError):
         return jsonify({'status': 'error', 'message': "Noto'g'ri ma'lumot kiritildi."})
 
+# --- Kassa terminallari uchun katalog o'zgarishlari ---
+@app.route('/api/catalog/changes')
+@login_required
+@role_required(['cashier', 'admin'])
+def catalog_changes_api():
+    since = request.args.get('since', 0, type=int)
+    location_id = request.args.get('location_id', type=int) or current_location_id()
+    changes = db.get_catalog_changes(since, location_id)
+    if changes is None:
+        return jsonify({'status': 'error', 'message': 'Baza bilan ulanishda xato.'}), 503
+    return jsonify(changes)
+
 # --- Chek Chop Etish ---
 @app.route('/receipt/<int:sale_id>')
 @login_required
@@ -208,8 +346,11 @@ def receipt_page(sale_id):
 @role_required('admin')
 def products_page():
     search_term = request.args.get('q', '')
-    products = db.view_products(search_term)
-    return render_template('products.html', products=products, search_term=search_term)
+    active = request.args.get('active', '')
+    page = db.list_products_page(search_term, active, **list_page_args())
+    list_args = {'q': search_term, 'active': active, 'sort': page['sort'], 'direction': page['direction']}
+    table_html = render_cached_fragment('_products_table.html', page=page, list_args=list_args)
+    return render_template('products.html', table_html=table_html, search_term=search_term, active=active)
 
 @app.route('/products/add', methods=['GET', 'POST'])
 @login_required
@@ -229,14 +370,21 @@ def add_product_page():
 def edit_product_page(product_id):
     if request.method == 'POST':
         is_active = 'is_active' in request.form
-        if db.update_product(product_id, request.form['name'], request.form['cost_price'], request.form['price'], request.form['quantity'], is_active):
+        if db.update_product(product_id, request.form['name'], request.form['cost_price'], request.form['price'], is_active, g.user['id']):
             flash(f"Mahsulot (ID: {product_id}) yangilandi!", 'success')
         else:
             flash("Mahsulotni yangilashda xatolik.", 'danger')
+        # Qoldiq tuzatishi alohida: u bajarilmasa ham nom/narx o'zgarishlari saqlanib qoladi
+        adjustment = request.form.get('stock_adjustment', 0, type=int)
+        if adjustment:
+            success, message = db.adjust_product_stock(product_id, adjustment, form_location_id(), g.user['id'])
+            flash(message if success else f"Qoldiq o'zgartirilmadi: {message}", 'success' if success else 'danger')
         return redirect(url_for('products_page'))
     
     product = db.get_product_by_id(product_id)
-    return render_template('product_form.html', title="Mahsulotni Tahrirlash", product=product)
+    return render_template('product_form.html', title="Mahsulotni Tahrirlash", product=product,
+                           stock_by_location=db.get_stock_by_location(product_id), locations=db.view_locations(),
+                           current_location_id=current_location_id())
 
 @app.route('/products/delete/<int:product_id>', methods=['POST'])
 @login_required
@@ -248,6 +396,54 @@ def delete_product_route(product_id):
         flash(f"Mahsulotni o'chirishda xatolik.", "danger")
     return redirect(url_for('products_page'))
 
+def _reprice_form_data():
+    def optional_float(name):
+        value = request.form.get(name, '').strip()
+        return float(value) if value else None
+
+    ids = [int(x) for x in re.findall(r'\d+', request.form.get('ids', ''))]
+    upload = request.files.get('ids_file')
+    if upload and upload.filename:
+        # Fayl: har bir qatorning birinchi ustuni - mahsulot ID
+        for line in upload.read().decode('utf-8', errors='ignore').splitlines():
+            first_column = line.split(',')[0].split(';')[0].strip()
+            if first_column.isdigit():
+                ids.append(int(first_column))
+    selection = {
+        'name_pattern': request.form.get('name_pattern', '').strip(),
+        'ids': ids,
+        'margin_min': optional_float('margin_min'),
+        'margin_max': optional_float('margin_max'),
+        'only_active': 'include_inactive' not in request.form,
+    }
+    rule = {
+        'mode': request.form.get('mode', 'percent'),
+        'value': float(request.form['value']),
+        'round_to': optional_float('round_to') or 0,
+        'round_mode': request.form.get('round_mode', 'nearest'),
+    }
+    return selection, rule
+
+@app.route('/products/reprice', methods=['GET', 'POST'])
+@login_required
+@role_required('admin')
+def reprice_products_page():
+    preview = None
+    ids_text = request.form.get('ids', '')
+    if request.method == 'POST':
+        try:
+            selection, rule = _reprice_form_data()
+            # Fayldan o'qilgan ID'lar "Qo'llash" bosilganda qayta yuborilishi uchun maydonga yoziladi
+            ids_text = ', '.join(str(product_id) for product_id in selection['ids'])
+            if request.form.get('action') == 'apply':
+                success, message, _ = db.apply_bulk_reprice(selection, rule, g.user['id'], request.form.get('reason', ''))
+                flash(message, 'success' if success else 'danger')
+                return redirect(url_for('products_page'))
+            preview = db.preview_bulk_reprice(selection, rule)
+        except (ValueError, TypeError, KeyError):
+            flash("Noto'g'ri ma'lumot kiritildi.", "danger")
+    return render_template('reprice.html', preview=preview, form=request.form, ids_text=ids_text)
+
 @app.route('/products/qr/<int:product_id>')
 @login_required
 @role_required('admin')
@@ -262,20 +458,23 @@ def qr_code_page(product_id):
 @role_required('admin')
 def users_page():
     search_term = request.args.get('q', '')
-    users = db.view_users(search_term)
-    return render_template('users.html', users=users, search_term=search_term)
+    role = request.args.get('role', '')
+    page = db.list_users_page(search_term, role, **list_page_args())
+    list_args = {'q': search_term, 'role': role, 'sort': page['sort'], 'direction': page['direction']}
+    table_html = render_cached_fragment('_users_table.html', page=page, list_args=list_args)
+    return render_template('users.html', table_html=table_html, search_term=search_term, role=role)
 
 @app.route('/users/add', methods=['GET', 'POST'])
 @login_required
 @role_required('admin')
 def add_user_page():
     if request.method == 'POST':
-        if db.add_user(request.form['username'], request.form['password'], request.form['role']):
+        if db.add_user(request.form['username'], request.form['password'], request.form['role'], request.form.get('location_id', type=int)):
             flash(f"'{request.form['username']}' foydalanuvchisi qo'shildi!", 'success')
         else:
             flash("Foydalanuvchi qo'shishda xatolik.", 'danger')
         return redirect(url_for('users_page'))
-    return render_template('user_form.html', title="Yangi Xodim Qo'shish")
+    return render_template('user_form.html', title="Yangi Xodim Qo'shish", locations=db.view_locations())
 
 @app.route('/users/edit/<int:user_id>', methods=['GET', 'POST'])
 @login_required
@@ -284,14 +483,15 @@ def edit_user_page(user_id):
     if request.method == 'POST':
         password = request.form.get('password')
         is_active = 'is_active' in request.form
-        if db.update_user(user_id, request.form['username'], request.form['role'], is_active, password if password else None):
+        if db.update_user(user_id, request.form['username'], request.form['role'], is_active, password if password else None,
+                          location_id=request.form.get('location_id', type=int)):
             flash(f"Xodim (ID: {user_id}) yangilandi!", 'success')
         else:
             flash("Xodimni yangilashda xatolik.", 'danger')
         return redirect(url_for('users_page'))
     
     user = db.get_user_by_id(user_id)
-    return render_template('user_form.html', title="Xodimni Tahrirlash", user=user)
+    return render_template('user_form.html', title="Xodimni Tahrirlash", user=user, locations=db.view_locations())
 
 @app.route('/users/delete/<int:user_id>', methods=['POST'])
 @login_required
@@ -343,12 +543,38 @@ def reports_page():
                            total_profit=total_profit,
                            start_date=start_date,
                            end_date=end_date)
-                           
+
+@app.route('/reports/pnl')
+@login_required
+@role_required('admin')
+def pnl_report_page():
+    today = datetime.today()
+    start_date = request.args.get('start_date', today.replace(month=1, day=1).strftime('%Y-%m-%d'))
+    end_date = request.args.get('end_date', today.strftime('%Y-%m-%d'))
+    granularity = request.args.get('granularity', 'month')
+    if granularity not in db.PNL_GRANULARITIES:
+        granularity = 'month'
+    try:
+        statement = db.get_pnl_statement(start_date, end_date, granularity)
+    except ValueError:
+        flash("Sana noto'g'ri kiritildi.", "danger")
+        statement = {'periods': [], 'totals': {}}
+    return render_template('pnl_report.html',
+                           periods=statement['periods'],
+                           totals=statement['totals'],
+                           start_date=start_date,
+                           end_date=end_date,
+                           granularity=granularity)
+
 @app.route('/warehouse')
 @login_required
 @role_required(['warehouse', 'admin'])
 def warehouse_dashboard():
-    return render_template('warehouse_dashboard.html', products=db.view_products())
+    location_id = request.args.get('location_id', type=int) or current_location_id()
+    return render_template('warehouse_dashboard.html',
+                           products=db.view_products(location_id=location_id),
+                           locations=db.view_locations(),
+                           location_id=location_id)
 
 @app.route('/warehouse/receive', methods=['POST'])
 @login_required
@@ -357,14 +583,17 @@ def receive_stock():
     try:
         product_id = int(request.form['product_id'])
         quantity = int(request.form['quantity'])
-        user_id = session['user']['id']
+        user_id = g.user['id']
         notes = request.form.get('notes', 'Omborga kirim')
         
-        success, message = db.warehouse_movement(product_id, abs(quantity), 'kirim', user_id, notes)
+        location_id = form_location_id()
+        
+        success, message = db.warehouse_movement(product_id, abs(quantity), 'kirim', user_id, notes, location_id)
         flash(message, 'success' if success else 'danger')
     except (ValueError, TypeError):
         flash("Noto'g'ri ma'lumot kiritildi.", "danger")
-    return redirect(url_for('warehouse_dashboard'))
+        location_id = None
+    return redirect(url_for('warehouse_dashboard', location_id=location_id))
 
 @app.route('/warehouse/dispatch', methods=['POST'])
 @login_required
@@ -373,20 +602,51 @@ def dispatch_stock():
     try:
         product_id = int(request.form['product_id'])
         quantity = int(request.form['quantity'])
-        user_id = session['user']['id']
+        user_id = g.user['id']
         notes = request.form.get('notes', 'Do\'konga chiqim')
 
-        success, message = db.warehouse_movement(product_id, -abs(quantity), 'chiqim', user_id, notes)
+        location_id = form_location_id()
+
+        success, message = db.warehouse_movement(product_id, -abs(quantity), 'chiqim', user_id, notes, location_id)
         flash(message, 'success' if success else 'danger')
     except (ValueError, TypeError):
         flash("Noto'g'ri ma'lumot kiritildi.", "danger")
+        location_id = None
+    return redirect(url_for('warehouse_dashboard', location_id=location_id))
+
+@app.route('/warehouse/transfer', methods=['POST'])
+@login_required
+@role_required(['warehouse', 'admin'])
+def transfer_stock():
+    try:
+        from_location_id = int(request.form['from_location_id'])
+        to_location_id = int(request.form['to_location_id'])
+        items = [(int(product_id), int(quantity)) for product_id, quantity in zip(request.form.getlist('product_id'), request.form.getlist('quantity')) if quantity]
+        notes = request.form.get('notes', '')
+
+        success, message, transfer_id = db.create_stock_transfer(from_location_id, to_location_id, items, g.user['id'], notes)
+        flash(message, 'success' if success else 'danger')
+    except (ValueError, TypeError, KeyError):
+        flash("Noto'g'ri ma'lumot kiritildi.", "danger")
+        from_location_id = None
+    return redirect(url_for('warehouse_dashboard', location_id=from_location_id))
+
+@app.route('/locations/add', methods=['POST'])
+@login_required
+@role_required('admin')
+def add_location_route():
+    location_type = request.form.get('location_type', 'store')
+    if location_type in ('store', 'warehouse') and db.add_location(request.form['name'], location_type):
+        flash(f"'{request.form['name']}' joylashuvi qo'shildi!", "success")
+    else:
+        flash("Joylashuv qo'shishda xatolik.", "danger")
     return redirect(url_for('warehouse_dashboard'))
 
 @app.route('/order-recommendations')
 @login_required
 @role_required(['admin', 'warehouse'])
 def order_recommendations_page():
-    recommendations = db.generate_automated_order_list()
+    recommendations = db.generate_automated_order_list(top_sellers=bestsellers.top_products(days=30, limit=10))
     return render_template('order_recommendations.html', recommendations=recommendations)
 
 @app.route('/inventory-history')
@@ -0,0 +1,205 @@
+# bestsellers.py
+# Eng ko'p sotilgan mahsulotlar: har kun uchun Space-Saving eskizi (eng ko'pi bilan `capacity` ta hisoblagich).
+# Sotuvlar faqat xotiradagi eskizga yoziladi; har bir jarayondagi fon oqimi ularni davriy ravishda
+# bestseller_counts jadvaliga qo'shadi va boshqa workerlarning hisoblari bilan birga qayta yuklaydi.
+# Jadval bo'sh bo'lsa (birinchi ishga tushish) sales jadvalidan quriladi.
+
+import os
+import threading
+import time
+from datetime import date, timedelta
+from operator import itemgetter
+
+import db_functions as db
+
+BESTSELLER_CAPACITY = 200
+BESTSELLER_RETENTION_DAYS = 90
+BESTSELLER_SYNC_SECONDS = 30
+
+class SpaceSaving:
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+
+    def add(self, item, count):
+        if item in self.counts:
+            self.counts[item] += count
+            if self.counts[item] <= 0:
+                del self.counts[item]
+                self.errors.pop(item, None)
+        elif count <= 0:
+            # Eskizda yo'q mahsulot sotuvining o'chirilishi: kamaytiradigan hisoblagich yo'q
+            return
+        elif len(self.counts) < self.capacity:
+            self.counts[item] = count
+            self.errors[item] = 0
+        else:
+            # Eng kichik hisoblagich o'rniga yangi mahsulot keladi, uning qiymati xato chegarasi bo'ladi
+            victim = min(self.counts, key=self.counts.get)
+            floor = self.counts.pop(victim)
+            self.errors.pop(victim, None)
+            self.counts[item] = floor + count
+            self.errors[item] = floor
+
+class BestsellerTracker:
+    def __init__(self, capacity=BESTSELLER_CAPACITY, retention_days=BESTSELLER_RETENTION_DAYS, sync_seconds=BESTSELLER_SYNC_SECONDS):
+        self.capacity = capacity
+        self.retention_days = retention_days
+        self.sync_seconds = sync_seconds
+        self._days = {}
+        self._pending = {}
+        self._ranked = {}
+        self._loaded_at = None
+        self._pruned_on = None
+        self._worker_pid = None
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+
+    def _oldest_day(self):
+        return date.today() - timedelta(days=self.retention_days)
+
+    def _apply(self, days, counts):
+        for day, products in counts.items():
+            sketch = days.get(day)
+            if sketch is None:
+                sketch = days[day] = SpaceSaving(self.capacity)
+            for product_id, quantity in products.items():
+                sketch.add(product_id, quantity)
+
+    def record(self, product_id, quantity, day=None):
+        day = day or date.today()
+        if day < self._oldest_day():
+            return
+        with self._lock:
+            self._apply(self._days, {day: {product_id: quantity}})
+            pending = self._pending.setdefault(day, {})
+            pending[product_id] = pending.get(product_id, 0) + quantity
+            self._ranked.clear()
+        self._ensure_worker()
+
+    def ranked(self, days=30):
+        # [(product_id, sold), ...] kamayish tartibida; natija keyingi o'zgarishgacha keshda turadi
+        self._ensure_worker()
+        if self._loaded_at is None:
+            # Warm-up'siz ishga tushgan jarayonda birinchi hisobot so'rovi yuklaydi (sotuv so'rovi emas)
+            self.sync()
+        today = date.today()
+        with self._lock:
+            result = self._ranked.get((today, days))
+            if result is None:
+                since = today - timedelta(days=days)
+                totals = {}
+                for day, sketch in self._days.items():
+                    if day >= since:
+                        for product_id, sold in sketch.counts.items():
+                            totals[product_id] = totals.get(product_id, 0) + sold
+                result = self._ranked[(today, days)] = sorted(totals.items(), key=itemgetter(1), reverse=True)
+        return result
+
+    def top(self, days=30, limit=5):
+        return self.ranked(days)[:limit]
+
+    def _ensure_worker(self):
+        # Oqimlar fork'dan keyin saqlanmaydi: har bir worker jarayoni o'z oqimini ishga tushiradi
+        if self._worker_pid == os.getpid():
+            return
+        with self._lock:
+            if self._worker_pid == os.getpid():
+                return
+            self._worker_pid = os.getpid()
+        threading.Thread(target=self._run, name='bestseller-sync', daemon=True).start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.sync_seconds)
+            try:
+                self.sync()
+            except Exception as e:
+                print(f"Error syncing bestsellers: {e}")
+
+    def sync(self):
+        if not self._sync_lock.acquire(blocking=False):
+            return
+        try:
+            if self._loaded_at is None:
+                self._load(rebuild_if_empty=True)
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if pending and not db.add_bestseller_counts(pending, self.capacity):
+                # Keyingi urinishda qayta yuboriladi
+                with self._lock:
+                    for day, products in pending.items():
+                        target = self._pending.setdefault(day, {})
+                        for product_id, quantity in products.items():
+                            target[product_id] = target.get(product_id, 0) + quantity
+            if self._pruned_on != date.today() and db.prune_bestseller_counts(self._oldest_day()):
+                self._pruned_on = date.today()
+            self._load()
+        finally:
+            self._sync_lock.release()
+
+    def _load(self, rebuild_if_empty=False):
+        rows = db.get_bestseller_counts(self._oldest_day())
+        if rows is None:
+            # Baza mavjud emas: hozirgi xotiradagi holat bilan davom etamiz
+            self._loaded_at = time.monotonic()
+            return
+        if not rows and rebuild_if_empty:
+            # Birinchi ishga tushish (jadval bo'sh): sales jadvalidan quramiz, mahalliy sotuvlar ham unga kiradi
+            with self._lock:
+                self._pending = {}
+            if db.rebuild_bestseller_counts(self.retention_days, self.capacity):
+                rows = db.get_bestseller_counts(self._oldest_day()) or []
+        counts = {}
+        for row in rows:
+            counts.setdefault(row['day'], {})[row['product_id']] = row['sold']
+        days = {}
+        self._apply(days, counts)
+        with self._lock:
+            # Bazaga hali yozilmagan mahalliy sotuvlar ustiga qo'shiladi
+            self._apply(days, self._pending)
+            self._days = days
+            self._ranked.clear()
+            self._loaded_at = time.monotonic()
+
+    def warm_up(self):
+        # Jadval faqat bo'sh (yoki saqlash muddatidan eski) bo'lsa sales'dan quriladi. Har ishga tushishda qayta qurish
+        # rolling restart paytida eski workerlar yuborgan (qurishga allaqachon kirgan) sotuvlarni ikki marta sanardi
+        with self._sync_lock:
+            self._load(rebuild_if_empty=True)
+
+    def rebuild(self):
+        # To'liq qayta qurish (qo'lda): ishlayotgan workerlar bo'lmaganda chaqiriladi
+        with self._sync_lock:
+            with self._lock:
+                self._pending = {}
+            db.rebuild_bestseller_counts(self.retention_days, self.capacity)
+            self._load()
+
+tracker = BestsellerTracker()
+
+def top_products(days=30, limit=5, active_only=True):
+    # {id, name, quantity, total_sold} - get_most_sold_products bilan bir xil shakl
+    ranked = tracker.ranked(days)
+    if active_only:
+        # Nofaol mahsulotlar chiqarib tashlanganda ham `limit` ta qolishi uchun zaxira bilan olinadi
+        ranked = ranked[:limit * 2 + 10]
+    else:
+        ranked = ranked[:limit]
+    products = {p['id']: p for p in db.get_products_by_ids([product_id for product_id, _ in ranked])}
+    result = []
+    for product_id, sold in ranked:
+        product = products.get(product_id)
+        if product is None or (active_only and not product['is_active']):
+            continue
+        result.append({'id': product_id, 'name': product['name'], 'quantity': product['quantity'], 'total_sold': sold})
+        if len(result) == limit:
+            break
+    return result
+
+def init_app(app):
+    import boot
+    db.on_sale(tracker.record)
+    boot.register_warm_up(tracker.warm_up)
+    return tracker
@@ -0,0 +1,74 @@
+# boot.py
+# Production ishga tushirish profili: preload, fork oldidan tozalash va keshlarni isitish.
+
+import gc
+import os
+import subprocess
+import sys
+from datetime import datetime
+
+_warm_up_callbacks = []
+
+# Og'ir modullar: worker ishga tushganda yuklanmasligi kerak
+HEAVY_MODULES = ('qrcode', 'PIL', 'jwt')
+
+def register_warm_up(callback):
+    _warm_up_callbacks.append(callback)
+    return callback
+
+def prepare_for_fork():
+    # Master jarayonda ochiq ulanish qolmaydi: DB va sessiya funksiyalari har chaqiruvda yangi ulanish ochib yopadi
+    gc.collect()
+    # Preload qilingan obyektlar GC tomonidan tegilmaydi -> copy-on-write sahifalar workerlarda ko'chirilmaydi
+    if hasattr(gc, 'freeze'):
+        gc.freeze()
+
+def warm_up(app):
+    import db_functions as db
+
+    # Jinja shablonlarini oldindan kompilyatsiya qilish
+    for name in app.jinja_env.list_templates():
+        if name.endswith('.html'):
+            app.jinja_env.get_template(name)
+
+    # products.quantity yig'indilari va yopilgan P&L davrlari bazada saqlanadi: birinchi so'rovlar ularni hisoblamaydi
+    today = datetime.today()
+    db.refresh_stock_totals()
+    db.get_pnl_statement(today.replace(month=1, day=1), today, 'month')
+    for callback in _warm_up_callbacks:
+        callback()
+
+def preload(app):
+    if os.environ.get('SAVDOGAR_WARM_UP', '1') == '1':
+        try:
+            warm_up(app)
+        except Exception as e:
+            print(f"⚠️ Warm-up xatosi: {e}")
+    prepare_for_fork()
+
+# --- Worker sovuq ishga tushish vaqti va xotirasini o'lchash ---
+_MEASURE_SCRIPT = """
+import resource, sys, time
+start = time.perf_counter()
+import wsgi
+elapsed = (time.perf_counter() - start) * 1000
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+heavy = [m for m in {heavy!r} if m in sys.modules]
+print(f"{{elapsed:.1f}} {{rss:.1f}} {{','.join(heavy) or '-'}}")
+"""
+
+def measure_cold_start(runs=5):
+    script = _MEASURE_SCRIPT.format(heavy=HEAVY_MODULES)
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    results = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', script], cwd=cwd, capture_output=True, text=True, check=True).stdout.split()
+        results.append((float(output[0]), float(output[1]), output[2]))
+    return results
+
+if __name__ == '__main__':
+    results = measure_cold_start(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
+    for i, (elapsed, rss, heavy) in enumerate(results, 1):
+        print(f"#{i}: import wsgi {elapsed:.1f} ms, RSS {rss:.1f} MB, og'ir modullar: {heavy}")
+    times = sorted(r[0] for r in results)
+    print(f"Mediana: {times[len(times) // 2]:.1f} ms, o'rtacha RSS: {sum(r[1] for r in results) / len(results):.1f} MB")
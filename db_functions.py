@@ -1,12 +1,15 @@
 # db_functions.py
 
+import base64
+import json
+import math
+import time
 import mysql.connector
-from datetime import datetime, timedelta
+from datetime import datetime, date, timedelta
 from werkzeug.security import generate_password_hash, check_password_hash
-import qrcode
-import io
-import base64
-import jwt
+
+# qrcode (Pillow bilan) va jwt faqat QR sahifalarida kerak, shuning uchun
+# ular har bir workerda emas, birinchi chaqiruvda yuklanadi.
 
 def connect_db():
     try:
@@ -18,6 +21,7 @@ def connect_db():
         return None
 
 def generate_user_login_token(user_id, secret_key):
+    import jwt
     try:
         payload = {
             'exp': datetime.utcnow() + timedelta(days=365 * 5),
@@ -29,20 +33,39 @@ def generate_user_login_token(user_id, secret_key):
         print(f"Error generating token: {e}")
         return None
 
-def _change_stock_and_log(cursor, product_id, quantity_change, movement_type, user_id, notes=""):
-    update_query = "UPDATE products SET quantity = quantity + %s WHERE id = %s AND quantity + %s >= 0"
-    cursor.execute(update_query, (quantity_change, product_id, quantity_change))
-    if cursor.rowcount == 0:
-        raise ValueError("Mahsulot qoldig'i yetarli emas yoki mahsulot topilmadi.")
-    log_query = "INSERT INTO inventory_movements (product_id, quantity_change, movement_type, user_id, notes) VALUES (%s, %s, %s, %s, %s)"
-    cursor.execute(log_query, (product_id, quantity_change, movement_type, user_id, notes))
+# --- Joylashuvlar (do'kon/ombor) bo'yicha qoldiq ---
+DEFAULT_LOCATION_ID = 1
+# Omborchilar biriktirilmagan bo'lsa ishlaydigan asosiy ombor (migrations/003_locations.sql)
+DEFAULT_WAREHOUSE_LOCATION_ID = 2
+# products.quantity - barcha joylashuvlar yig'indisi, harakatlar jurnalidan bosqichma-bosqich yangilanadi
+STOCK_TOTALS_REFRESH_SECONDS = 15
+STOCK_TOTALS_DELAY_SECONDS = 5
+_stock_totals_refreshed_at = None
+
+def _log_catalog_change(cursor, entity, entity_id, location_id=None):
+    # Kassa terminallari uchun o'zgarishlar lentasi: version - monoton o'suvchi raqam
+    cursor.execute("INSERT INTO catalog_changes (entity, entity_id, location_id) VALUES (%s, %s, %s)", (entity, entity_id, location_id))
+
+def _change_stock_and_log(cursor, product_id, quantity_change, movement_type, user_id, notes="", location_id=DEFAULT_LOCATION_ID):
+    # Faqat (joylashuv, mahsulot) qatori qulflanadi: kassalar bitta umumiy qatorda kutib qolmaydi
+    if quantity_change >= 0:
+        update_query = "INSERT INTO location_stock (location_id, product_id, quantity) VALUES (%s, %s, %s) ON DUPLICATE KEY UPDATE quantity = quantity + VALUES(quantity)"
+        cursor.execute(update_query, (location_id, product_id, quantity_change))
+    else:
+        update_query = "UPDATE location_stock SET quantity = quantity + %s WHERE location_id = %s AND product_id = %s AND quantity + %s >= 0"
+        cursor.execute(update_query, (quantity_change, location_id, product_id, quantity_change))
+        if cursor.rowcount == 0:
+            raise ValueError("Mahsulot qoldig'i yetarli emas yoki mahsulot topilmadi.")
+    log_query = "INSERT INTO inventory_movements (product_id, quantity_change, movement_type, user_id, notes, location_id) VALUES (%s, %s, %s, %s, %s, %s)"
+    cursor.execute(log_query, (product_id, quantity_change, movement_type, user_id, notes, location_id))
+    _log_catalog_change(cursor, 'stock', product_id, location_id)
 
-def warehouse_movement(product_id, quantity, movement_type, user_id, notes=""):
+def warehouse_movement(product_id, quantity, movement_type, user_id, notes="", location_id=DEFAULT_LOCATION_ID):
     conn = connect_db()
     if not conn: return False, "Baza bilan ulanishda xato."
     try:
         cursor = conn.cursor()
-        _change_stock_and_log(cursor, product_id, quantity, movement_type, user_id, notes)
+        _change_stock_and_log(cursor, product_id, quantity, movement_type, user_id, notes, location_id)
         conn.commit()
         return True, "Operatsiya muvaffaqiyatli bajarildi."
     except (mysql.connector.Error, ValueError) as e:
@@ -51,33 +74,281 @@ def warehouse_movement(product_id, quantity, movement_type, user_id, notes=""):
     finally:
         if conn: conn.close()
 
-def process_sale(product_id, quantity, user_id, customer_id=None):
+def create_stock_transfer(from_location_id, to_location_id, items, user_id, notes=""):
+    if from_location_id == to_location_id: return False, "Jo'natuvchi va qabul qiluvchi joylashuv bir xil.", None
+    if not items: return False, "Ko'chirish uchun mahsulot tanlanmagan.", None
     conn = connect_db()
     if not conn: return False, "Baza bilan ulanishda xato.", None
+    try:
+        cursor = conn.cursor()
+        cursor.execute("INSERT INTO stock_transfers (from_location_id, to_location_id, user_id, notes) VALUES (%s, %s, %s, %s)", (from_location_id, to_location_id, user_id, notes))
+        transfer_id = cursor.lastrowid
+        changes = []
+        for product_id, quantity in sorted(items):
+            quantity = abs(int(quantity))
+            cursor.execute("INSERT INTO stock_transfer_items (transfer_id, product_id, quantity) VALUES (%s, %s, %s)", (transfer_id, product_id, quantity))
+            changes.append((from_location_id, product_id, -quantity, 'chiqim'))
+            changes.append((to_location_id, product_id, quantity, 'kirim'))
+        # location_stock qatorlari doim (joylashuv, mahsulot) tartibida qulflanadi: qarama-qarshi
+        # yo'nalishdagi (A->B va B->A) bir vaqtdagi ko'chirishlar ham bir-birini kutib deadlock'ga tushmaydi
+        for location_id, product_id, quantity, movement_type in sorted(changes):
+            _change_stock_and_log(cursor, product_id, quantity, movement_type, user_id, f"Ko'chirish #{transfer_id}", location_id)
+        conn.commit()
+        return True, f"Ko'chirish #{transfer_id} muvaffaqiyatli bajarildi.", transfer_id
+    except (mysql.connector.Error, ValueError) as e:
+        conn.rollback()
+        return False, str(e), None
+    finally:
+        if conn: conn.close()
+
+def view_locations(only_active=True):
+    conn = connect_db()
+    if not conn: return []
+    try:
+        cursor = conn.cursor(dictionary=True)
+        query = "SELECT id, name, location_type, is_active FROM locations"
+        if only_active:
+            query += " WHERE is_active = TRUE"
+        cursor.execute(query + " ORDER BY id")
+        return cursor.fetchall()
+    finally:
+        if conn: conn.close()
+
+def add_location(name, location_type):
+    conn = connect_db()
+    if not conn: return False
+    try:
+        cursor = conn.cursor()
+        cursor.execute("INSERT INTO locations (name, location_type) VALUES (%s, %s)", (name, location_type))
+        conn.commit()
+        return True
+    except mysql.connector.IntegrityError:
+        return False
+    finally:
+        if conn: conn.close()
+
+def get_stock_by_location(product_id):
+    conn = connect_db()
+    if not conn: return []
+    try:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute("SELECT l.id AS location_id, l.name, l.location_type, ls.quantity FROM location_stock ls JOIN locations l ON ls.location_id = l.id WHERE ls.product_id = %s ORDER BY l.id", (product_id,))
+        return cursor.fetchall()
+    finally:
+        if conn: conn.close()
+
+def refresh_stock_totals():
+    # Oxirgi yangilanishdan keyin harakati bo'lgan mahsulotlar uchungina yig'indi qayta hisoblanadi
+    conn = connect_db()
+    if not conn: return 0
     try:
         cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM products WHERE id = %s AND is_active = TRUE FOR UPDATE", (product_id,))
+        cursor.execute("SELECT GET_LOCK('stock_totals_refresh', 0) AS locked")
+        if not cursor.fetchone()['locked']: return 0
+        try:
+            # Chegara commit qilingan holatga asoslanadi: inventory_movements'ga yozayotgan eng eski ochiq tranzaksiyadan
+            # oldingi harakatlar. Ochiq qolgan tranzaksiya commit qilinganda uning harakatlari keyingi yangilanishda olinadi
+            oldest_active = _oldest_writer_started(cursor, 'inventory_movements')
+            conn.commit()
+            cursor.execute("SELECT last_id FROM sync_watermarks WHERE name = 'stock_totals'")
+            row = cursor.fetchone()
+            low = row['last_id'] if row else 0
+            cursor.execute("SELECT COALESCE(MAX(id), 0) AS high FROM inventory_movements WHERE id > %s AND movement_date < %s - INTERVAL %s SECOND", (low, oldest_active, STOCK_TOTALS_DELAY_SECONDS))
+            high = cursor.fetchone()['high']
+            if not high: return 0
+            cursor.execute("""
+                UPDATE products p JOIN (
+                    SELECT ls.product_id, SUM(ls.quantity) AS total FROM location_stock ls
+                    WHERE ls.product_id IN (SELECT DISTINCT product_id FROM inventory_movements WHERE id > %s AND id <= %s)
+                    GROUP BY ls.product_id
+                ) t ON t.product_id = p.id
+                SET p.quantity = t.total""", (low, high))
+            updated = cursor.rowcount
+            cursor.execute("INSERT INTO sync_watermarks (name, last_id) VALUES ('stock_totals', %s) ON DUPLICATE KEY UPDATE last_id = VALUES(last_id)", (high,))
+            conn.commit()
+            return updated
+        finally:
+            cursor.execute("DO RELEASE_LOCK('stock_totals_refresh')")
+    except mysql.connector.Error as e:
+        conn.rollback()
+        print(f"Error refreshing stock totals: {e}")
+        return 0
+    finally:
+        if conn: conn.close()
+
+def _maybe_refresh_stock_totals():
+    global _stock_totals_refreshed_at
+    now = datetime.now()
+    if _stock_totals_refreshed_at and (now - _stock_totals_refreshed_at).total_seconds() < STOCK_TOTALS_REFRESH_SECONDS:
+        return
+    _stock_totals_refreshed_at = now
+    refresh_stock_totals()
+
+# --- Kassa terminallari uchun katalog sinxronizatsiyasi ---
+CATALOG_CHANGES_LIMIT = 5000
+# "Xavfsiz" versiya: catalog_changes'ga yozayotgan eng eski ochiq tranzaksiya boshlanishidan (shu soniya zaxira bilan) oldin yozilgan o'zgarishlar.
+# Undan yangi yozuvlar hali commit qilinmagan bo'lishi mumkin va keyingi so'rovda yuboriladi
+CATALOG_SAFE_LAG_SECONDS = 2
+CATALOG_PRODUCT_COLUMNS = ('id', 'name', 'price', 'is_active')
+CATALOG_STOCK_COLUMNS = ('product_id', 'quantity')
+CATALOG_CUSTOMER_COLUMNS = ('id', 'name', 'phone_number')
+
+def _fetch_catalog_rows(cursor, query, params, columns):
+    cursor.execute(query, params)
+    return {'columns': list(columns), 'rows': [[_json_value(row[column]) for column in columns] for row in cursor.fetchall()]}
+
+def _json_value(value):
+    if isinstance(value, (int, str)) or value is None: return value
+    return float(value)
+
+def _oldest_writer_started(cursor, table):
+    # Shu jadvalga yozgan (jadval qulfini olgan) ochiq tranzaksiyalarning eng eskisi boshlangan vaqt, bo'lmasa NOW().
+    # Faqat o'qiyotgan yoki boshqa jadvallarga yozayotgan tranzaksiyalar (hisobot, zaxira nusxa, ochiq qolgan konsol) hisobga olinmaydi.
+    # Hali yozmagan tranzaksiyaning yozuvi NOW() dan keyingi vaqt bilan tushadi, shuning uchun chegaradan yangi bo'ladi
+    cursor.execute("""
+        SELECT COALESCE(MIN(t.trx_started), NOW()) AS oldest_active FROM information_schema.innodb_trx t
+        WHERE t.trx_mysql_thread_id <> CONNECTION_ID() AND t.trx_id IN (
+            SELECT l.ENGINE_TRANSACTION_ID FROM performance_schema.data_locks l
+            WHERE l.OBJECT_SCHEMA = DATABASE() AND l.OBJECT_NAME = %s AND l.LOCK_TYPE = 'TABLE')""", (table,))
+    return cursor.fetchone()['oldest_active']
+
+def get_catalog_changes(since, location_id=DEFAULT_LOCATION_ID, limit=CATALOG_CHANGES_LIMIT):
+    conn = connect_db()
+    if not conn: return None
+    try:
+        cursor = conn.cursor(dictionary=True)
+        # Ochiq tranzaksiyalar snapshot'dan oldin o'qiladi: undan keyin boshlanganlarning yozuvlari chegaradan yangi bo'ladi
+        oldest_active = _oldest_writer_started(cursor, 'catalog_changes')
+        conn.commit()
+        cursor.execute("SELECT last_id FROM sync_watermarks WHERE name = 'catalog_pruned'")
+        row = cursor.fetchone()
+        pruned_version = row['last_id'] if row else 0
+        # Chegaradagi yozuv changed_at indeksi bo'ylab teskari tartibda bitta qator o'qib topiladi (MAX butun oraliqni o'qirdi)
+        cursor.execute("SELECT version FROM catalog_changes WHERE changed_at < %s - INTERVAL %s SECOND ORDER BY changed_at DESC, version DESC LIMIT 1", (oldest_active, CATALOG_SAFE_LAG_SECONDS))
+        row = cursor.fetchone()
+        safe_version = max(row['version'] if row else 0, pruned_version)
+        product_columns = ", ".join(f"p.{column}" for column in CATALOG_PRODUCT_COLUMNS)
+        customer_columns = ", ".join(CATALOG_CUSTOMER_COLUMNS)
+
+        # Lenta tozalangan yoki terminal yangi bo'lsa - to'liq nusxa
+        if since <= 0 or since < pruned_version:
+            return {
+                'version': safe_version,
+                'full': True,
+                'more': False,
+                'products': _fetch_catalog_rows(cursor, f"SELECT {product_columns} FROM products p ORDER BY p.id", (), CATALOG_PRODUCT_COLUMNS),
+                'deleted_products': [],
+                'stock': _fetch_catalog_rows(cursor, "SELECT product_id, quantity FROM location_stock WHERE location_id = %s ORDER BY product_id", (location_id,), CATALOG_STOCK_COLUMNS),
+                'customers': _fetch_catalog_rows(cursor, f"SELECT {customer_columns} FROM customers ORDER BY id", (), CATALOG_CUSTOMER_COLUMNS),
+            }
+
+        # Faqat xavfsiz versiyagacha: undan yuqorisida hali ko'rinmaydigan (commit qilinmagan) bo'shliqlar bo'lishi mumkin
+        cursor.execute("SELECT version, entity, entity_id, location_id FROM catalog_changes WHERE version > %s AND version <= %s ORDER BY version LIMIT %s", (since, safe_version, limit))
+        changes = cursor.fetchall()
+        more = len(changes) == limit
+        product_ids, stock_ids, customer_ids = set(), set(), set()
+        for change in changes:
+            if change['entity'] == 'product':
+                product_ids.add(change['entity_id'])
+            elif change['entity'] == 'customer':
+                customer_ids.add(change['entity_id'])
+            elif change['location_id'] in (None, location_id):
+                stock_ids.add(change['entity_id'])
+
+        def in_clause(ids):
+            return ", ".join(["%s"] * len(ids))
+
+        empty = {'columns': [], 'rows': []}
+        products = _fetch_catalog_rows(cursor, f"SELECT {product_columns} FROM products p WHERE p.id IN ({in_clause(product_ids)})", tuple(product_ids), CATALOG_PRODUCT_COLUMNS) if product_ids else dict(empty, columns=list(CATALOG_PRODUCT_COLUMNS))
+        stock = _fetch_catalog_rows(cursor, f"SELECT product_id, quantity FROM location_stock WHERE location_id = %s AND product_id IN ({in_clause(stock_ids)})", (location_id, *stock_ids), CATALOG_STOCK_COLUMNS) if stock_ids else dict(empty, columns=list(CATALOG_STOCK_COLUMNS))
+        customers = _fetch_catalog_rows(cursor, f"SELECT {customer_columns} FROM customers WHERE id IN ({in_clause(customer_ids)})", tuple(customer_ids), CATALOG_CUSTOMER_COLUMNS) if customer_ids else dict(empty, columns=list(CATALOG_CUSTOMER_COLUMNS))
+        found_products = {row[0] for row in products['rows']}
+
+        # To'liq sahifa bo'lsa oxirgi yozuvdan, aks holda xavfsiz versiyadan davom etiladi (ikkalasi ham chegaradan oshmaydi)
+        next_version = changes[-1]['version'] if more else max(since, safe_version)
+        return {
+            'version': next_version,
+            'full': False,
+            'more': more,
+            'products': products,
+            'deleted_products': sorted(product_ids - found_products),
+            'stock': stock,
+            'customers': customers,
+        }
+    finally:
+        if conn: conn.close()
+
+def prune_catalog_changes(keep_days=30):
+    conn = connect_db()
+    if not conn: return 0
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT MAX(version) FROM catalog_changes WHERE changed_at < NOW() - INTERVAL %s DAY", (keep_days,))
+        pruned_version = cursor.fetchone()[0]
+        if not pruned_version: return 0
+        # Shu versiyadan eski 'since' bilan kelgan terminal to'liq nusxa oladi
+        cursor.execute("INSERT INTO sync_watermarks (name, last_id) VALUES ('catalog_pruned', %s) ON DUPLICATE KEY UPDATE last_id = GREATEST(last_id, VALUES(last_id))", (pruned_version,))
+        cursor.execute("DELETE FROM catalog_changes WHERE version <= %s", (pruned_version,))
+        deleted = cursor.rowcount
+        conn.commit()
+        return deleted
+    finally:
+        if conn: conn.close()
+
+# Sotuvdan keyin (commit'dan so'ng) chaqiriladigan funksiyalar, masalan, bestseller hisoblagichlari
+_sale_listeners = []
+
+def on_sale(callback):
+    _sale_listeners.append(callback)
+    return callback
+
+def _notify_sale(product_id, quantity, day):
+    for callback in _sale_listeners:
+        try:
+            callback(product_id, quantity, day)
+        except Exception as e:
+            print(f"Error in sale listener: {e}")
+
+def process_sale(product_id, quantity, user_id, customer_id=None, redeem_points=0, location_id=DEFAULT_LOCATION_ID):
+    conn = connect_db()
+    if not conn: return False, "Baza bilan ulanishda xato.", None
+    try:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute("SELECT p.id, p.price, p.cost_price, COALESCE(ls.quantity, 0) AS quantity FROM products p LEFT JOIN location_stock ls ON ls.product_id = p.id AND ls.location_id = %s WHERE p.id = %s AND p.is_active = TRUE",
+                       (location_id, product_id))
         product = cursor.fetchone()
         
         if not product: return False, f"Mahsulot (ID: {product_id}) topilmadi yoki faol emas.", None
         if product['quantity'] < quantity: return False, f"Omborda yetarli mahsulot yo'q. Qoldiq: {product['quantity']} dona.", None
         
-        profit = (product['price'] - product['cost_price']) * quantity
+        total_price = product['price'] * quantity
+        discount = 0
+        if customer_id and redeem_points > 0:
+            balance = _loyalty_balance(cursor, customer_id, lock=True)
+            if balance < redeem_points: return False, f"Bonus ballari yetarli emas. Qoldiq: {balance} ball.", None
+            discount = min(redeem_points * LOYALTY_POINT_VALUE, total_price)
+            redeem_points = math.ceil(discount / LOYALTY_POINT_VALUE)
+
+        profit = (product['price'] - product['cost_price']) * quantity - discount
         
-        sql_sale = "INSERT INTO sales (product_id, quantity, user_id, customer_id, profit) VALUES (%s, %s, %s, %s, %s)"
-        cursor.execute(sql_sale, (product_id, quantity, user_id, customer_id, profit))
+        sql_sale = "INSERT INTO sales (product_id, quantity, unit_price, discount, user_id, customer_id, profit, location_id) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)"
+        cursor.execute(sql_sale, (product_id, quantity, product['price'], discount, user_id, customer_id, profit, location_id))
         sale_id = cursor.lastrowid
 
-        _change_stock_and_log(cursor, product_id, -abs(quantity), 'sotuv', user_id, f"Sotuv #{sale_id}")
-        
-        total_price = product['price'] * quantity
+        _change_stock_and_log(cursor, product_id, -abs(quantity), 'sotuv', user_id, f"Sotuv #{sale_id}", location_id)
         
         if customer_id:
-            bonus_points = int(total_price / 10000)
+            # Mijoz qatori yangilanmaydi: faqat jurnalga yozuv qo'shiladi (qator qulfi yo'q)
+            if discount:
+                _append_loyalty_entry(cursor, customer_id, 'redeem', -int(redeem_points), sale_id, user_id)
+            bonus_points = int((total_price - discount) / LOYALTY_EARN_RATE)
             if bonus_points > 0:
-                cursor.execute("UPDATE customers SET bonus_points = bonus_points + %s WHERE id = %s", (bonus_points, customer_id))
+                _append_loyalty_entry(cursor, customer_id, 'earn', bonus_points, sale_id, user_id)
 
         conn.commit()
+        _notify_sale(product_id, quantity, date.today())
+        if discount:
+            return True, f"Sotuv muvaffaqiyatli! Umumiy narx: {total_price - discount:.2f} (bonus chegirma: {discount:.2f})", sale_id
         return True, f"Sotuv muvaffaqiyatli! Umumiy narx: {total_price:.2f}", sale_id
     except (mysql.connector.Error, ValueError) as e:
         conn.rollback()
@@ -85,12 +356,186 @@ def process_sale(product_id, quantity, user_id, customer_id=None):
     finally:
         if conn: conn.close()
         
+# --- Sodiqlik (bonus) ballari jurnali ---
+LOYALTY_EARN_RATE = 10000  # har 10 000 so'm uchun 1 ball
+LOYALTY_POINT_VALUE = 100  # 1 ball = 100 so'm chegirma
+LOYALTY_ENTRY_TYPES = ('earn', 'redeem', 'adjust', 'expire')
+# Siqish faqat shu vaqtdan eski yozuvlarni oladi: hali commit qilinmagan tranzaksiyalar o'tkazib yuborilmasin
+LOYALTY_COMPACT_DELAY_MINUTES = 5
+
+def _append_loyalty_entry(cursor, customer_id, entry_type, points, sale_id=None, user_id=None, notes=""):
+    cursor.execute("INSERT INTO loyalty_ledger (customer_id, entry_type, points, sale_id, user_id, notes) VALUES (%s, %s, %s, %s, %s, %s)",
+                   (customer_id, entry_type, points, sale_id, user_id, notes))
+
+def _loyalty_balance(cursor, customer_id, lock=False):
+    # Balans = siqilgan yig'indi + undan keyingi jurnal yozuvlari
+    if lock:
+        # ON DUPLICATE KEY UPDATE mavjud qatorni darhol eksklyuziv qulflaydi (INSERT IGNORE umumiy qulf olardi va
+        # keyingi FOR UPDATE bilan ikki bir vaqtdagi sotuv bir-birini deadlock'ga tushirardi)
+        cursor.execute("INSERT INTO loyalty_balances (customer_id, balance, last_entry_id) VALUES (%s, 0, 0) ON DUPLICATE KEY UPDATE customer_id = customer_id", (customer_id,))
+        cursor.execute("SELECT balance, last_entry_id FROM loyalty_balances WHERE customer_id = %s FOR UPDATE", (customer_id,))
+    else:
+        cursor.execute("SELECT balance, last_entry_id FROM loyalty_balances WHERE customer_id = %s", (customer_id,))
+    cached = cursor.fetchone() or {'balance': 0, 'last_entry_id': 0}
+    # Qulf bilan o'qishda jurnal ham qulflab o'qiladi: oddiy SELECT tranzaksiya boshidagi snapshot'ni ko'radi
+    # va qulfni kutib turgan paytda boshqa sotuvda commit qilingan 'redeem' yozuvini ko'rmay qoladi
+    lock_clause = " FOR SHARE" if lock else ""
+    cursor.execute(f"SELECT COALESCE(SUM(points), 0) AS pending FROM loyalty_ledger WHERE customer_id = %s AND id > %s{lock_clause}", (customer_id, cached['last_entry_id']))
+    return int(cached['balance']) + int(cursor.fetchone()['pending'])
+
+def get_loyalty_balance(customer_id):
+    conn = connect_db()
+    if not conn: return 0
+    try:
+        return _loyalty_balance(conn.cursor(dictionary=True), customer_id)
+    finally:
+        if conn: conn.close()
+
+def get_loyalty_balances(customer_ids):
+    # {customer_id: balance} bir so'rovda: siqilgan balans + undan keyingi jurnal yozuvlari
+    if not customer_ids: return {}
+    conn = connect_db()
+    if not conn: return {}
+    try:
+        cursor = conn.cursor(dictionary=True)
+        placeholders = ", ".join(["%s"] * len(customer_ids))
+        cursor.execute(f"""
+            SELECT c.id, CAST(COALESCE(b.balance, 0) + COALESCE(SUM(l.points), 0) AS SIGNED) AS balance
+            FROM customers c
+            LEFT JOIN loyalty_balances b ON b.customer_id = c.id
+            LEFT JOIN loyalty_ledger l ON l.customer_id = c.id AND l.id > COALESCE(b.last_entry_id, 0)
+            WHERE c.id IN ({placeholders})
+            GROUP BY c.id, b.balance""", tuple(customer_ids))
+        return {row['id']: row['balance'] for row in cursor.fetchall()}
+    finally:
+        if conn: conn.close()
+
+def get_loyalty_history(customer_id, limit=50):
+    conn = connect_db()
+    if not conn: return []
+    try:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute("SELECT id, entry_type, points, sale_id, notes, created_at FROM loyalty_ledger WHERE customer_id = %s ORDER BY id DESC LIMIT %s", (customer_id, limit))
+        return cursor.fetchall()
+    finally:
+        if conn: conn.close()
+
+def adjust_loyalty_points(customer_id, points, user_id, notes=""):
+    conn = connect_db()
+    if not conn: return False, "Baza bilan ulanishda xato."
+    try:
+        cursor = conn.cursor(dictionary=True)
+        if points < 0:
+            balance = _loyalty_balance(cursor, customer_id, lock=True)
+            if balance + points < 0:
+                return False, f"Bonus ballari yetarli emas. Qoldiq: {balance} ball."
+        _append_loyalty_entry(cursor, customer_id, 'adjust', points, user_id=user_id, notes=notes)
+        conn.commit()
+        return True, "Bonus ballari o'zgartirildi."
+    except mysql.connector.Error as e:
+        conn.rollback()
+        return False, str(e)
+    finally:
+        if conn: conn.close()
+
+def compact_loyalty_balances(batch_size=5000):
+    conn = connect_db()
+    if not conn: return 0
+    try:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute("SELECT GET_LOCK('loyalty_compact', 0) AS locked")
+        if not cursor.fetchone()['locked']: return 0
+        try:
+            # Oldingi siqishlar shu id'gacha bo'lgan barcha yozuvlarni hisobga olgan
+            cursor.execute("SELECT COALESCE(MAX(last_entry_id), 0) AS low FROM loyalty_balances")
+            low = cursor.fetchone()['low']
+            cursor.execute("SELECT COALESCE(MAX(id), 0) AS high FROM loyalty_ledger WHERE created_at < NOW() - INTERVAL %s MINUTE", (LOYALTY_COMPACT_DELAY_MINUTES,))
+            high = cursor.fetchone()['high']
+            compacted = 0
+            while low < high:
+                chunk_end = min(low + batch_size, high)
+                cursor.execute("""
+                    INSERT INTO loyalty_balances (customer_id, balance, last_entry_id)
+                    SELECT l.customer_id, SUM(l.points), MAX(l.id) FROM loyalty_ledger l
+                    LEFT JOIN loyalty_balances b ON b.customer_id = l.customer_id
+                    WHERE l.id > %s AND l.id <= %s AND l.id > COALESCE(b.last_entry_id, 0)
+                    GROUP BY l.customer_id
+                    ON DUPLICATE KEY UPDATE balance = balance + VALUES(balance), last_entry_id = VALUES(last_entry_id)""", (low, chunk_end))
+                compacted += cursor.rowcount
+                # Eski sahifalar uchun customers.bonus_points ham yangilab turiladi
+                cursor.execute("""
+                    UPDATE customers c JOIN loyalty_balances b ON b.customer_id = c.id
+                    SET c.bonus_points = b.balance
+                    WHERE c.id IN (SELECT DISTINCT customer_id FROM loyalty_ledger WHERE id > %s AND id <= %s)""", (low, chunk_end))
+                conn.commit()
+                low = chunk_end
+            return compacted
+        finally:
+            cursor.execute("DO RELEASE_LOCK('loyalty_compact')")
+    except mysql.connector.Error as e:
+        conn.rollback()
+        print(f"Error compacting loyalty balances: {e}")
+        return 0
+    finally:
+        if conn: conn.close()
+
+# Sarflangan/o'chgan ballar eng eski ballardan ayiriladi; qolgan eski "earn" ballar o'chadi
+_LOYALTY_EXPIRABLE_SQL = """
+    SELECT customer_id,
+           SUM(CASE WHEN entry_type = 'earn' AND created_at < %s THEN points ELSE 0 END)
+           + SUM(CASE WHEN points < 0 THEN points ELSE 0 END) AS expirable
+    FROM loyalty_ledger WHERE {where} GROUP BY customer_id"""
+
+def expire_loyalty_points(older_than_days=365, batch_size=500):
+    conn = connect_db()
+    if not conn: return 0
+    try:
+        cursor = conn.cursor(dictionary=True)
+        cutoff = datetime.now() - timedelta(days=older_than_days)
+        notes = f"{cutoff:%Y-%m-%d} gacha yig'ilgan ballar muddati tugadi"
+        # Cron bir vaqtda ikki marta ishga tushirsa, ballar ikki marta o'chirilmasin
+        cursor.execute("SELECT GET_LOCK('loyalty_expire', 0) AS locked")
+        if not cursor.fetchone()['locked']: return 0
+        try:
+            expired, last_id = 0, 0
+            while True:
+                cursor.execute("SELECT id FROM customers WHERE id > %s ORDER BY id LIMIT %s", (last_id, batch_size))
+                ids = [row['id'] for row in cursor.fetchall()]
+                if not ids: break
+                last_id = ids[-1]
+                cursor.execute(f"SELECT customer_id FROM ({_LOYALTY_EXPIRABLE_SQL.format(where='customer_id BETWEEN %s AND %s')}) t WHERE expirable > 0",
+                               (cutoff, ids[0], ids[-1]))
+                candidates = [row['customer_id'] for row in cursor.fetchall()]
+                if not candidates:
+                    conn.commit()
+                    continue
+                # Sotuvdagi ball sarflash bilan bir xil balans qatori qulfi (id tartibida): bir vaqtda sarflangan ballar ikki marta ayirilmaydi
+                cursor.execute(f"INSERT INTO loyalty_balances (customer_id, balance, last_entry_id) VALUES {', '.join(['(%s, 0, 0)'] * len(candidates))} ON DUPLICATE KEY UPDATE customer_id = customer_id",
+                               candidates)
+                # Qulfdan keyin jurnal qayta o'qiladi (INSERT ... SELECT oxirgi commit qilingan yozuvlarni ko'radi)
+                placeholders = ", ".join(["%s"] * len(candidates))
+                cursor.execute(f"""
+                    INSERT INTO loyalty_ledger (customer_id, entry_type, points, notes)
+                    SELECT customer_id, 'expire', -expirable, %s FROM ({_LOYALTY_EXPIRABLE_SQL.format(where=f'customer_id IN ({placeholders})')}) t
+                    WHERE expirable > 0""", (notes, cutoff, *candidates))
+                expired += cursor.rowcount
+                conn.commit()
+            return expired
+        finally:
+            cursor.execute("DO RELEASE_LOCK('loyalty_expire')")
+    except mysql.connector.Error as e:
+        conn.rollback()
+        print(f"Error expiring loyalty points: {e}")
+        return 0
+    finally:
+        if conn: conn.close()
+
 def get_inventory_history():
     conn = connect_db()
     if not conn: return []
     try:
         cursor = conn.cursor(dictionary=True)
-        query = "SELECT im.id, im.movement_date, p.name as product_name, im.quantity_change, im.movement_type, u.username as user_name FROM inventory_movements im JOIN products p ON im.product_id = p.id LEFT JOIN users u ON im.user_id = u.id ORDER BY im.movement_date DESC"
+        query = "SELECT im.id, im.movement_date, p.name as product_name, im.quantity_change, im.movement_type, u.username as user_name, l.name as location_name FROM inventory_movements im JOIN products p ON im.product_id = p.id LEFT JOIN users u ON im.user_id = u.id LEFT JOIN locations l ON im.location_id = l.id ORDER BY im.movement_date DESC"
         cursor.execute(query)
         return cursor.fetchall()
     finally:
@@ -107,6 +552,133 @@ def delete_inventory_movement(movement_id):
     finally:
         if conn: conn.close()
 
+# --- Sahifalangan ro'yxatlar (keyset) ---
+PAGE_SIZE = 50
+COUNT_CACHE_SECONDS = 60
+COUNT_CACHE_SIZE = 512
+_count_cache = None
+# Jadval o'zgarsa uning avlodi oshadi: eski kalitlar endi so'ralmaydi va LRU'dan o'z-o'zidan chiqib ketadi
+_count_generations = {}
+
+def _count_cache_lru():
+    # session_store db_functions'ni import qiladi, shuning uchun kesh birinchi chaqiruvda yaratiladi
+    global _count_cache
+    if _count_cache is None:
+        import session_store
+        _count_cache = session_store.LRUCache(COUNT_CACHE_SIZE)
+    return _count_cache
+
+def _invalidate_count_cache(table):
+    _count_generations[table] = _count_generations.get(table, 0) + 1
+
+def _cached_count(cursor, table, where, params):
+    cache = _count_cache_lru()
+    key = (table, _count_generations.get(table, 0), where, tuple(params))
+    now = time.monotonic()
+    cached = cache.get(key)
+    if cached and cached[1] > now:
+        return cached[0]
+    cursor.execute(f"SELECT COUNT(*) AS total FROM {table} WHERE {where}", params)
+    total = cursor.fetchone()['total']
+    cache.set(key, (total, now + COUNT_CACHE_SECONDS))
+    return total
+
+def _encode_page_cursor(row, sort):
+    raw = json.dumps([row[sort], row['id']], default=str)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def _decode_page_cursor(token):
+    try:
+        value, row_id = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        # Qo'lda o'zgartirilgan kursor: SQL parametriga faqat oddiy qiymat tushishi kerak
+        if not isinstance(value, (str, int, float)) or not isinstance(row_id, int):
+            return None
+        if isinstance(value, float) and not math.isfinite(value):
+            return None
+        return value, int(row_id)
+    except (ValueError, TypeError):
+        return None
+
+def _keyset_page(table, columns, sortable, conditions, params, sort='id', direction='desc', after=None, before=None, page_size=PAGE_SIZE):
+    if sort not in sortable: sort = 'id'
+    direction = 'asc' if direction == 'asc' else 'desc'
+    where = " AND ".join(conditions) or "TRUE"
+    page_conditions, page_params = list(conditions), list(params)
+
+    decoded = _decode_page_cursor(after or before) if (after or before) else None
+    backward = bool(decoded) and not after
+    if decoded:
+        value, last_id = decoded
+        # Keyingi sahifa: kamayish tartibida kichikroq, o'sish tartibida kattaroq qiymatlar
+        op = '<' if (direction == 'desc') != backward else '>'
+        if sort == 'id':
+            page_conditions.append(f"id {op} %s")
+            page_params.append(last_id)
+        else:
+            page_conditions.append(f"({sort} {op} %s OR ({sort} = %s AND id {op} %s))")
+            page_params.extend([value, value, last_id])
+    order_dir = direction.upper() if not backward else ('ASC' if direction == 'desc' else 'DESC')
+    order = f"id {order_dir}" if sort == 'id' else f"{sort} {order_dir}, id {order_dir}"
+
+    conn = connect_db()
+    if not conn: return {'rows': [], 'total': 0, 'next_cursor': None, 'prev_cursor': None, 'sort': sort, 'direction': direction}
+    try:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(f"SELECT {columns} FROM {table} WHERE {' AND '.join(page_conditions) or 'TRUE'} ORDER BY {order} LIMIT %s", page_params + [page_size + 1])
+        rows = cursor.fetchall()
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if backward:
+            rows.reverse()
+        has_next = has_more if not backward else True
+        has_prev = has_more if backward else bool(decoded)
+        return {
+            'rows': rows,
+            'total': _cached_count(cursor, table, where, params),
+            'next_cursor': _encode_page_cursor(rows[-1], sort) if rows and has_next else None,
+            'prev_cursor': _encode_page_cursor(rows[0], sort) if rows and has_prev else None,
+            'sort': sort,
+            'direction': direction,
+        }
+    finally:
+        if conn: conn.close()
+
+def list_products_page(search_term="", active="", **page_args):
+    _maybe_refresh_stock_totals()
+    conditions, params = [], []
+    if search_term:
+        conditions.append("name LIKE %s")
+        params.append(f"%{search_term}%")
+    if active in ('0', '1'):
+        conditions.append("is_active = %s")
+        params.append(active == '1')
+    return _keyset_page("products", "id, name, cost_price, price, quantity, is_active",
+                        ('id', 'name', 'cost_price', 'price', 'quantity'), conditions, params, **page_args)
+
+def list_customers_page(search_term="", **page_args):
+    conditions, params = [], []
+    if search_term:
+        conditions.append("(name LIKE %s OR phone_number LIKE %s)")
+        params.extend([f"%{search_term}%", f"%{search_term}%"])
+    page = _keyset_page("customers", "id, name, phone_number",
+                        ('id', 'name', 'phone_number'), conditions, params, **page_args)
+    # Ballar faqat sahifadagi mijozlar uchun jurnaldan olinadi (customers.bonus_points eskiradi)
+    balances = get_loyalty_balances([row['id'] for row in page['rows']])
+    for row in page['rows']:
+        row['bonus_points'] = balances.get(row['id'], 0)
+    return page
+
+def list_users_page(search_term="", role="", **page_args):
+    conditions, params = [], []
+    if search_term:
+        conditions.append("username LIKE %s")
+        params.append(f"%{search_term}%")
+    if role:
+        conditions.append("role = %s")
+        params.append(role)
+    return _keyset_page("users", "id, username, role, is_active",
+                        ('id', 'username', 'role'), conditions, params, **page_args)
+
 def view_customers(search_term=""):
     conn = connect_db()
     if not conn: return []
@@ -129,7 +701,9 @@ def add_customer(name, phone_number):
     try:
         cursor = conn.cursor()
         cursor.execute("INSERT INTO customers (name, phone_number) VALUES (%s, %s)", (name, phone_number))
+        _log_catalog_change(cursor, 'customer', cursor.lastrowid)
         conn.commit()
+        _invalidate_count_cache('customers')
         return True
     except mysql.connector.IntegrityError:
         return False
@@ -152,6 +726,7 @@ def update_customer(customer_id, name, phone_number):
     try:
         cursor = conn.cursor()
         cursor.execute("UPDATE customers SET name = %s, phone_number = %s WHERE id = %s", (name, phone_number, customer_id))
+        _log_catalog_change(cursor, 'customer', customer_id)
         conn.commit()
         return True
     except mysql.connector.IntegrityError:
@@ -165,6 +740,7 @@ def add_expense(description, amount, expense_date, user_id):
     try:
         cursor = conn.cursor()
         cursor.execute("INSERT INTO expenses (description, amount, expense_date, user_id) VALUES (%s, %s, %s, %s)", (description, amount, expense_date, user_id))
+        _invalidate_pnl_periods(cursor, expense_date)
         conn.commit()
         return True
     finally:
@@ -178,33 +754,231 @@ def get_expenses_by_date(start_date, end_date):
         query = "SELECT e.*, u.username FROM expenses e JOIN users u ON e.user_id = u.id WHERE e.expense_date BETWEEN %s AND %s ORDER BY e.expense_date DESC"
         cursor.execute(query, (start_date, end_date))
         expenses = cursor.fetchall()
-        total_expenses = sum(exp['amount'] for exp in expenses)
+        cursor.execute("SELECT COALESCE(SUM(amount), 0) AS total FROM expenses WHERE expense_date BETWEEN %s AND %s", (start_date, end_date))
+        total_expenses = cursor.fetchone()['total']
         return expenses, total_expenses
     finally:
         if conn: conn.close()
 
-def get_analytics_data(days=30):
+# --- Foyda va Zarar (P&L) hisoboti ---
+PNL_GRANULARITIES = ('day', 'week', 'month', 'year')
+
+# Tushum sotuv vaqtidagi narx va chegirmadan olinadi (mahsulotning joriy narxidan emas)
+SALE_REVENUE_SQL = "s.quantity * s.unit_price - s.discount"
+
+# Davr boshini SQL'da hisoblash (sana formatidagi '%' belgilarisiz)
+_PNL_BUCKET_SQL = {
+    'day': "DATE({col})",
+    'week': "DATE_SUB(DATE({col}), INTERVAL WEEKDAY({col}) DAY)",
+    'month': "DATE_SUB(DATE({col}), INTERVAL DAYOFMONTH({col}) - 1 DAY)",
+    'year': "MAKEDATE(YEAR({col}), 1)",
+}
+
+def _to_date(value):
+    if isinstance(value, datetime): return value.date()
+    if isinstance(value, date): return value
+    return datetime.strptime(str(value)[:10], '%Y-%m-%d').date()
+
+def _pnl_period_start(day, granularity):
+    if granularity == 'day': return day
+    if granularity == 'week': return day - timedelta(days=day.weekday())
+    if granularity == 'month': return day.replace(day=1)
+    return day.replace(month=1, day=1)
+
+def _pnl_next_period(start, granularity):
+    if granularity == 'day': return start + timedelta(days=1)
+    if granularity == 'week': return start + timedelta(days=7)
+    if granularity == 'month': return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return start.replace(year=start.year + 1)
+
+def _pnl_periods(start_date, end_date, granularity):
+    # (boshlanish, tugash, to'liq) - birinchi va oxirgi davr so'ralgan oraliq bilan qirqiladi
+    periods = []
+    current = _pnl_period_start(start_date, granularity)
+    stop = end_date + timedelta(days=1)
+    while current < stop:
+        next_start = _pnl_next_period(current, granularity)
+        clipped_start, clipped_end = max(current, start_date), min(next_start, stop)
+        periods.append((clipped_start, clipped_end, (clipped_start, clipped_end) == (current, next_start)))
+        current = next_start
+    return periods
+
+def _pnl_missing_runs(periods, frozen):
+    # Muzlatilmagan davrlarning uzluksiz bo'laklari: [(boshlanish, tugash), ...]
+    runs = []
+    for start, end, full in periods:
+        if start in frozen: continue
+        if runs and runs[-1][1] == start:
+            runs[-1] = (runs[-1][0], end)
+        else:
+            runs.append((start, end))
+    return runs
+
+def _invalidate_pnl_periods(cursor, day):
+    # Yopilgan davrga tegishli sotuv/xarajat o'zgarsa, muzlatilgan natija o'chiriladi
+    day = _to_date(day)
+    conditions = " OR ".join(["(granularity = %s AND period_start = %s)"] * len(PNL_GRANULARITIES))
+    params = []
+    for granularity in PNL_GRANULARITIES:
+        params.extend([granularity, _pnl_period_start(day, granularity)])
+    cursor.execute(f"DELETE FROM pnl_closed_periods WHERE {conditions}", params)
+
+def _aggregate_pnl(cursor, start_date, end_date, granularity):
+    sales_bucket = _PNL_BUCKET_SQL[granularity].format(col='s.sale_date')
+    expense_bucket = _PNL_BUCKET_SQL[granularity].format(col='expense_date')
+    query = f"""
+        SELECT bucket, SUM(revenue) AS revenue, SUM(gross_profit) AS gross_profit, SUM(expenses) AS expenses FROM (
+            SELECT {sales_bucket} AS bucket, {SALE_REVENUE_SQL} AS revenue, s.profit AS gross_profit, 0 AS expenses
+            FROM sales s WHERE s.sale_date >= %s AND s.sale_date < %s
+            UNION ALL
+            SELECT {expense_bucket} AS bucket, 0, 0, amount FROM expenses WHERE expense_date >= %s AND expense_date < %s
+        ) t GROUP BY bucket"""
+    cursor.execute(query, (start_date, end_date, start_date, end_date))
+    result = {}
+    for row in cursor.fetchall():
+        revenue = float(row['revenue'] or 0)
+        gross_profit = float(row['gross_profit'] or 0)
+        result[_to_date(row['bucket'])] = {'revenue': revenue, 'cogs': revenue - gross_profit, 'expenses': float(row['expenses'] or 0)}
+    return result
+
+def get_pnl_statement(start_date, end_date, granularity='month'):
+    if granularity not in PNL_GRANULARITIES:
+        raise ValueError(f"Noma'lum davr turi: {granularity}")
+    periods = _pnl_periods(_to_date(start_date), _to_date(end_date), granularity)
+    if not periods: return {'periods': [], 'totals': {}}
+    conn = connect_db()
+    if not conn: return {'periods': [], 'totals': {}}
+    try:
+        cursor = conn.cursor(dictionary=True)
+        today = date.today()
+        cursor.execute("SELECT period_start, revenue, cogs, expenses FROM pnl_closed_periods WHERE granularity = %s AND period_start >= %s AND period_start < %s",
+                       (granularity, periods[0][0], periods[-1][1]))
+        stored = {_to_date(row['period_start']): {'revenue': float(row['revenue']), 'cogs': float(row['cogs']), 'expenses': float(row['expenses'])} for row in cursor.fetchall()}
+        # Qirqilgan (to'liq bo'lmagan) davrlar muzlatilgan natijani ishlatmaydi va saqlanmaydi
+        frozen = {start: stored[start] for start, end, full in periods if full and start in stored}
+
+        # Faqat muzlatilmagan davrlar (odatda joriy ochiq davr) xom yozuvlardan qayta hisoblanadi
+        missing = [(start, end, full) for start, end, full in periods if start not in frozen]
+        if missing:
+            # Har bir uzluksiz bo'lak alohida: qirqilgan boshi va ochiq oxiri orasidagi yillar qayta o'qilmaydi
+            computed = {}
+            for run_start, run_end in _pnl_missing_runs(periods, frozen):
+                computed.update(_aggregate_pnl(cursor, run_start, run_end, granularity))
+            to_freeze = []
+            for start, end, full in missing:
+                values = computed.get(_pnl_period_start(start, granularity), {'revenue': 0.0, 'cogs': 0.0, 'expenses': 0.0})
+                frozen[start] = values
+                if full and end <= today:
+                    to_freeze.append((granularity, start, values['revenue'], values['cogs'], values['expenses']))
+            if to_freeze:
+                cursor.executemany("INSERT INTO pnl_closed_periods (granularity, period_start, revenue, cogs, expenses) VALUES (%s, %s, %s, %s, %s) ON DUPLICATE KEY UPDATE revenue = VALUES(revenue), cogs = VALUES(cogs), expenses = VALUES(expenses)", to_freeze)
+                conn.commit()
+
+        rows = []
+        totals = {'revenue': 0.0, 'cogs': 0.0, 'gross_profit': 0.0, 'expenses': 0.0, 'net_profit': 0.0}
+        for start, end, full in periods:
+            values = frozen[start]
+            gross_profit = values['revenue'] - values['cogs']
+            row = {'period': start, 'revenue': values['revenue'], 'cogs': values['cogs'], 'gross_profit': gross_profit,
+                   'expenses': values['expenses'], 'net_profit': gross_profit - values['expenses'], 'closed': end <= today}
+            rows.append(row)
+            for key in totals:
+                totals[key] += row[key]
+        return {'periods': rows, 'totals': totals}
+    finally:
+        if conn: conn.close()
+
+# --- Analitika grafigi: ixtiyoriy oraliq, SQL'da guruhlangan va siqilgan qatorlar ---
+ANALYTICS_BUCKETS = ('hour', 'day', 'week', 'month')
+ANALYTICS_MAX_POINTS = 120
+ANALYTICS_MAX_DAYS = 3660
+
+_ANALYTICS_BUCKET_SQL = dict(_PNL_BUCKET_SQL, hour="TIMESTAMP(DATE({col}), MAKETIME(HOUR({col}), 0, 0))")
+
+def _analytics_bucket_start(moment, bucket):
+    if bucket == 'hour': return moment.replace(minute=0, second=0, microsecond=0)
+    return _pnl_period_start(moment.date(), bucket)
+
+def _analytics_next_bucket(start, bucket):
+    if bucket == 'hour': return start + timedelta(hours=1)
+    return _pnl_next_period(start, bucket)
+
+def _analytics_bucket_count(start, end, bucket):
+    days = (end - start).total_seconds() / 86400
+    if bucket == 'hour': return days * 24
+    if bucket == 'day': return days
+    if bucket == 'week': return days / 7
+    return days / 30
+
+def choose_analytics_bucket(start, end, bucket=None):
+    # Berilgan bo'lak juda mayda bo'lsa (masalan, bir yilga soatlik), kattarog'iga o'tiladi
+    candidates = ANALYTICS_BUCKETS[ANALYTICS_BUCKETS.index(bucket):] if bucket in ANALYTICS_BUCKETS else ANALYTICS_BUCKETS
+    for candidate in candidates:
+        if _analytics_bucket_count(start, end, candidate) <= ANALYTICS_MAX_POINTS:
+            return candidate
+    return 'month'
+
+def get_analytics_series(start, end, bucket=None):
+    # start/end - datetime, end kirmaydi; natija ustunli massivlar ko'rinishida
+    if end <= start or end - start > timedelta(days=ANALYTICS_MAX_DAYS):
+        raise ValueError("Noto'g'ri sana oralig'i")
+    bucket = choose_analytics_bucket(start, end, bucket)
+    buckets = []
+    current = _analytics_bucket_start(start, bucket)
+    while True:
+        moment = current if bucket == 'hour' else datetime.combine(current, datetime.min.time())
+        if moment >= end: break
+        buckets.append(current)
+        current = _analytics_next_bucket(current, bucket)
+    series = {'bucket': bucket, 't': [], 'sales': [], 'profit': [], 'expenses': [],
+              'totals': {'sales': 0.0, 'profit': 0.0, 'expenses': 0.0}}
+    if not buckets: return series
+    conn = connect_db()
+    if not conn: return None
+    try:
+        cursor = conn.cursor(dictionary=True)
+        sales_bucket = _ANALYTICS_BUCKET_SQL[bucket].format(col='s.sale_date')
+        expense_bucket = _ANALYTICS_BUCKET_SQL[bucket].format(col='expense_date')
+        query = f"""
+            SELECT bucket, SUM(sales) AS sales, SUM(profit) AS profit, SUM(expenses) AS expenses FROM (
+                SELECT {sales_bucket} AS bucket, {SALE_REVENUE_SQL} AS sales, s.profit AS profit, 0 AS expenses
+                FROM sales s WHERE s.sale_date >= %s AND s.sale_date < %s
+                UNION ALL
+                SELECT {expense_bucket} AS bucket, 0, 0, amount FROM expenses WHERE expense_date >= %s AND expense_date < %s
+            ) t GROUP BY bucket"""
+        cursor.execute(query, (start, end, start, end))
+        rows = {}
+        for row in cursor.fetchall():
+            key = row['bucket'] if bucket == 'hour' else _to_date(row['bucket'])
+            rows[key] = row
+        label_format = '%Y-%m-%d %H:00' if bucket == 'hour' else '%Y-%m-%d'
+        for key in buckets:
+            row = rows.get(key, {})
+            series['t'].append(key.strftime(label_format))
+            for name in ('sales', 'profit', 'expenses'):
+                value = round(float(row.get(name) or 0), 2)
+                series[name].append(value)
+                series['totals'][name] += value
+        return series
+    finally:
+        if conn: conn.close()
+
+def get_analytics_data(days=30, top_products=None):
     conn = connect_db()
     if not conn: return {}
     try:
         cursor = conn.cursor(dictionary=True)
         date_limit = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
-        
-        sales_query = "SELECT DATE(s.sale_date) as date, SUM(s.quantity * p.price) as total_sales, SUM(s.profit) as total_profit FROM sales s JOIN products p ON s.product_id = p.id WHERE s.sale_date >= %s GROUP BY DATE(s.sale_date) ORDER BY date"
-        cursor.execute(sales_query, (date_limit,))
-        sales_data = cursor.fetchall()
 
-        expenses_query = "SELECT expense_date as date, SUM(amount) as total_expenses FROM expenses WHERE expense_date >= %s GROUP BY expense_date ORDER BY date"
-        cursor.execute(expenses_query, (date_limit,))
-        expenses_data = cursor.fetchall()
-        
-        top_products_query = "SELECT p.name, SUM(s.quantity) as total_sold FROM sales s JOIN products p ON s.product_id = p.id WHERE s.sale_date >= %s GROUP BY p.name ORDER BY total_sold DESC LIMIT 5"
-        cursor.execute(top_products_query, (date_limit,))
-        top_products = cursor.fetchall()
+        # Grafik ma'lumotlari sahifaga joylanmaydi: brauzer /api/analytics orqali oladi
+        if top_products is None:
+            top_products_query = "SELECT p.name, SUM(s.quantity) as total_sold FROM sales s JOIN products p ON s.product_id = p.id WHERE s.sale_date >= %s GROUP BY p.name ORDER BY total_sold DESC LIMIT 5"
+            cursor.execute(top_products_query, (date_limit,))
+            top_products = cursor.fetchall()
 
-        cursor.execute("SELECT SUM(s.quantity * p.price) FROM sales s JOIN products p ON s.product_id = p.id WHERE s.sale_date >= %s", (date_limit,))
+        cursor.execute(f"SELECT SUM({SALE_REVENUE_SQL}) AS revenue FROM sales s WHERE s.sale_date >= %s", (date_limit,))
         result_revenue = cursor.fetchone()
-        total_revenue = result_revenue['SUM(s.quantity * p.price)'] if result_revenue and result_revenue['SUM(s.quantity * p.price)'] is not None else 0
+        total_revenue = result_revenue['revenue'] if result_revenue and result_revenue['revenue'] is not None else 0
 
         cursor.execute("SELECT SUM(profit) FROM sales WHERE sale_date >= %s", (date_limit,))
         result_profit = cursor.fetchone()
@@ -214,24 +988,7 @@ def get_analytics_data(days=30):
         result_expenses = cursor.fetchone()
         total_expenses = result_expenses['SUM(amount)'] if result_expenses and result_expenses['SUM(amount)'] is not None else 0
 
-        chart_data = {}
-        for day in range(days, -1, -1):
-            date_str = (datetime.now() - timedelta(days=day)).strftime('%Y-%m-%d')
-            chart_data[date_str] = {'sales': 0, 'expenses': 0, 'profit': 0}
-
-        for row in sales_data:
-            date_str = row['date'].strftime('%Y-%m-%d')
-            if date_str in chart_data:
-                chart_data[date_str]['sales'] = float(row.get('total_sales', 0))
-                chart_data[date_str]['profit'] = float(row.get('total_profit', 0))
-        
-        for row in expenses_data:
-            date_str = row['date'].strftime('%Y-%m-%d')
-            if date_str in chart_data:
-                chart_data[date_str]['expenses'] = float(row.get('total_expenses', 0))
-        
         return {
-            "chart_data": chart_data,
             "top_products": top_products,
             "total_revenue": total_revenue,
             "total_profit": total_profit,
@@ -245,7 +1002,7 @@ def get_sale_details_for_receipt(sale_id):
     if not conn: return None
     try:
         cursor = conn.cursor(dictionary=True)
-        query = "SELECT s.id, s.sale_date, p.name as product_name, s.quantity, p.price, (s.quantity * p.price) as total_amount, u.username as cashier_name, c.name as customer_name FROM sales s JOIN products p ON s.product_id = p.id JOIN users u ON s.user_id = u.id LEFT JOIN customers c ON s.customer_id = c.id WHERE s.id = %s"
+        query = f"SELECT s.id, s.sale_date, p.name as product_name, s.quantity, s.unit_price AS price, (s.quantity * s.unit_price) AS subtotal_amount, s.discount, ({SALE_REVENUE_SQL}) AS total_amount, u.username as cashier_name, c.name as customer_name FROM sales s JOIN products p ON s.product_id = p.id JOIN users u ON s.user_id = u.id LEFT JOIN customers c ON s.customer_id = c.id WHERE s.id = %s"
         cursor.execute(query, (sale_id,))
         return cursor.fetchone()
     finally:
@@ -264,19 +1021,25 @@ def check_user_credentials(username, password):
     finally:
         if conn: conn.close()
 
-def view_users(search_term=""):
+# Foydalanuvchi o'zgarganda (masalan, sessiya keshini tozalash uchun) chaqiriladigan funksiyalar
+_user_change_listeners = []
+
+def on_user_change(callback):
+    _user_change_listeners.append(callback)
+    return callback
+
+def _notify_user_change(user_id):
+    for callback in _user_change_listeners:
+        callback(user_id)
+
+def get_user_auth(user_id):
+    # None - foydalanuvchi yo'q; False - baza javob bermadi (sessiyani o'chirish uchun sabab emas)
     conn = connect_db()
-    if not conn: return []
+    if not conn: return False
     try:
         cursor = conn.cursor(dictionary=True)
-        query = "SELECT id, username, role, is_active FROM users"
-        params = []
-        if search_term:
-            query += " WHERE username LIKE %s"
-            params.append(f"%{search_term}%")
-        query += " ORDER BY id DESC"
-        cursor.execute(query, params)
-        return cursor.fetchall()
+        cursor.execute("SELECT id, username, role, is_active, location_id FROM users WHERE id = %s", (user_id,))
+        return cursor.fetchone()
     finally:
         if conn: conn.close()
 
@@ -290,32 +1053,39 @@ def get_user_by_id(user_id):
     finally:
         if conn: conn.close()
 
-def add_user(username, password, role):
+def default_location_for_role(role):
+    return DEFAULT_WAREHOUSE_LOCATION_ID if role == 'warehouse' else DEFAULT_LOCATION_ID
+
+def add_user(username, password, role, location_id=None):
     conn = connect_db()
     if not conn: return False
     try:
         cursor = conn.cursor()
         hashed_password = generate_password_hash(password)
-        sql = "INSERT INTO users (username, password, role) VALUES (%s, %s, %s)"
-        cursor.execute(sql, (username, hashed_password, role))
+        sql = "INSERT INTO users (username, password, role, location_id) VALUES (%s, %s, %s, %s)"
+        cursor.execute(sql, (username, hashed_password, role, location_id or default_location_for_role(role)))
         conn.commit()
+        _invalidate_count_cache('users')
         return True
     finally:
         if conn: conn.close()
 
-def update_user(user_id, username, role, is_active, password=None):
+def update_user(user_id, username, role, is_active, password=None, location_id=None):
     conn = connect_db()
     if not conn: return False
     try:
         cursor = conn.cursor()
+        location_id = location_id or default_location_for_role(role)
         if password:
             hashed_password = generate_password_hash(password)
-            sql = "UPDATE users SET username = %s, role = %s, is_active = %s, password = %s WHERE id = %s"
-            cursor.execute(sql, (username, role, is_active, hashed_password, user_id))
+            sql = "UPDATE users SET username = %s, role = %s, is_active = %s, location_id = %s, password = %s WHERE id = %s"
+            cursor.execute(sql, (username, role, is_active, location_id, hashed_password, user_id))
         else:
-            sql = "UPDATE users SET username = %s, role = %s, is_active = %s WHERE id = %s"
-            cursor.execute(sql, (username, role, is_active, user_id))
+            sql = "UPDATE users SET username = %s, role = %s, is_active = %s, location_id = %s WHERE id = %s"
+            cursor.execute(sql, (username, role, is_active, location_id, user_id))
         conn.commit()
+        _invalidate_count_cache('users')
+        _notify_user_change(user_id)
         return True
     finally:
         if conn: conn.close()
@@ -328,21 +1098,29 @@ def hard_delete_user(user_id):
         # Bog'liq yozuvlar DB'da `ON DELETE SET NULL` orqali to'g'rilanadi
         cursor.execute("DELETE FROM users WHERE id = %s", (user_id,))
         conn.commit()
+        _invalidate_count_cache('users')
+        _notify_user_change(user_id)
         return cursor.rowcount > 0
     finally:
         if conn: conn.close()
 
-def view_products(search_term=""):
+def view_products(search_term="", location_id=None):
+    if location_id is None:
+        _maybe_refresh_stock_totals()
     conn = connect_db()
     if not conn: return []
     try:
         cursor = conn.cursor(dictionary=True)
-        query = "SELECT * FROM products"
         params = []
+        if location_id is None:
+            query = "SELECT * FROM products p"
+        else:
+            query = "SELECT p.id, p.name, p.cost_price, p.price, p.is_active, COALESCE(ls.quantity, 0) AS quantity FROM products p LEFT JOIN location_stock ls ON ls.product_id = p.id AND ls.location_id = %s"
+            params.append(location_id)
         if search_term:
-            query += " WHERE name LIKE %s"
+            query += " WHERE p.name LIKE %s"
             params.append(f"%{search_term}%")
-        query += " ORDER BY id DESC"
+        query += " ORDER BY p.id DESC"
         cursor.execute(query, params)
         return cursor.fetchall()
     finally:
@@ -364,19 +1142,141 @@ def add_product(name, cost_price, price, quantity):
     try:
         cursor = conn.cursor()
         cursor.execute("INSERT INTO products (name, cost_price, price, quantity) VALUES (%s, %s, %s, %s)", (name, cost_price, price, quantity))
+        product_id = cursor.lastrowid
+        cursor.execute("INSERT INTO location_stock (location_id, product_id, quantity) VALUES (%s, %s, %s)", (DEFAULT_LOCATION_ID, product_id, quantity))
+        _log_catalog_change(cursor, 'product', product_id)
+        _log_catalog_change(cursor, 'stock', product_id, DEFAULT_LOCATION_ID)
         conn.commit()
+        _invalidate_count_cache('products')
         return True
     finally:
         if conn: conn.close()
 
-def update_product(product_id, name, cost_price, price, quantity, is_active):
+def update_product(product_id, name, cost_price, price, is_active, user_id=None):
+    # Qoldiq bu yerda o'zgartirilmaydi: u joylashuvga bog'liq, adjust_product_stock orqali alohida tuzatiladi
     conn = connect_db()
     if not conn: return False
     try:
         cursor = conn.cursor()
-        cursor.execute("UPDATE products SET name = %s, cost_price = %s, price = %s, quantity = %s, is_active = %s WHERE id = %s", (name, cost_price, price, quantity, is_active, product_id))
+        cursor.execute("INSERT INTO price_history (product_id, old_price, new_price, user_id, reason) SELECT id, price, %s, %s, 'Tahrirlash' FROM products WHERE id = %s AND price <> %s", (price, user_id, product_id, price))
+        cursor.execute("UPDATE products SET name = %s, cost_price = %s, price = %s, is_active = %s WHERE id = %s", (name, cost_price, price, is_active, product_id))
+        _log_catalog_change(cursor, 'product', product_id)
         conn.commit()
+        _invalidate_count_cache('products')
         return True
+    except mysql.connector.Error as e:
+        conn.rollback()
+        print(f"Error updating product: {e}")
+        return False
+    finally:
+        if conn: conn.close()
+
+def adjust_product_stock(product_id, quantity_change, location_id, user_id):
+    # Tahrirlash formasidagi tuzatish: tanlangan joylashuv qoldig'iga +/- miqdor, jami darhol qayta hisoblanadi
+    conn = connect_db()
+    if not conn: return False, "Baza bilan ulanishda xato."
+    try:
+        cursor = conn.cursor()
+        _change_stock_and_log(cursor, product_id, quantity_change, 'kirim' if quantity_change > 0 else 'chiqim', user_id, "Tuzatish", location_id)
+        cursor.execute("UPDATE products SET quantity = (SELECT COALESCE(SUM(quantity), 0) FROM location_stock WHERE product_id = %s) WHERE id = %s", (product_id, product_id))
+        conn.commit()
+        _invalidate_count_cache('products')
+        return True, "Qoldiq tuzatildi."
+    except (mysql.connector.Error, ValueError) as e:
+        conn.rollback()
+        return False, str(e)
+    finally:
+        if conn: conn.close()
+
+# --- Ommaviy narx o'zgartirish ---
+REPRICE_MODES = ('percent', 'absolute', 'target_margin')
+REPRICE_ROUND_MODES = {'nearest': 'ROUND', 'up': 'CEILING', 'down': 'FLOOR'}
+
+def _reprice_selection(selection):
+    # Tanlov: nom namunasi, ID ro'yxati, ustama (tannarxga nisbatan %) oralig'i
+    conditions, params = [], []
+    if selection.get('only_active', True):
+        conditions.append("p.is_active = TRUE")
+    if selection.get('name_pattern'):
+        pattern = selection['name_pattern'].replace('*', '%')
+        conditions.append("p.name LIKE %s")
+        params.append(pattern if '%' in pattern else f"%{pattern}%")
+    if selection.get('ids'):
+        conditions.append(f"p.id IN ({', '.join(['%s'] * len(selection['ids']))})")
+        params.extend(selection['ids'])
+    if selection.get('margin_min') is not None:
+        conditions.append("p.cost_price > 0 AND (p.price - p.cost_price) / p.cost_price * 100 >= %s")
+        params.append(selection['margin_min'])
+    if selection.get('margin_max') is not None:
+        conditions.append("p.cost_price > 0 AND (p.price - p.cost_price) / p.cost_price * 100 <= %s")
+        params.append(selection['margin_max'])
+    return " AND ".join(conditions) or "TRUE", params
+
+def _reprice_expression(rule):
+    mode = rule.get('mode')
+    if mode == 'percent':
+        expr = "p.price * (1 + %s / 100)"
+    elif mode == 'absolute':
+        expr = "p.price + %s"
+    elif mode == 'target_margin':
+        expr = "p.cost_price * (1 + %s / 100)"
+    else:
+        raise ValueError(f"Noma'lum narx qoidasi: {mode}")
+    params = [rule['value']]
+    round_to = rule.get('round_to') or 0
+    if round_to > 0:
+        round_func = REPRICE_ROUND_MODES.get(rule.get('round_mode', 'nearest'), 'ROUND')
+        expr = f"{round_func}(({expr}) / %s) * %s"
+        params.extend([round_to, round_to])
+    else:
+        expr = f"ROUND({expr}, 2)"
+    return f"GREATEST({expr}, 0)", params
+
+def preview_bulk_reprice(selection, rule, limit=200):
+    where, where_params = _reprice_selection(selection)
+    expr, expr_params = _reprice_expression(rule)
+    conn = connect_db()
+    if not conn: return {'rows': [], 'summary': {}}
+    try:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(f"""
+            SELECT COUNT(*) AS product_count, SUM({expr} <> p.price) AS changed_count,
+                   COALESCE(SUM(p.price), 0) AS old_total, COALESCE(SUM({expr}), 0) AS new_total,
+                   SUM({expr} < p.cost_price) AS below_cost_count
+            FROM products p WHERE {where}""", expr_params * 3 + where_params)
+        summary = cursor.fetchone()
+        cursor.execute(f"SELECT p.id, p.name, p.cost_price, p.price AS old_price, {expr} AS new_price FROM products p WHERE {where} ORDER BY p.id LIMIT %s",
+                       expr_params + where_params + [limit])
+        return {'rows': cursor.fetchall(), 'summary': summary}
+    finally:
+        if conn: conn.close()
+
+def apply_bulk_reprice(selection, rule, user_id, reason="", chunk_size=1000):
+    where, where_params = _reprice_selection(selection)
+    expr, expr_params = _reprice_expression(rule)
+    conn = connect_db()
+    if not conn: return False, "Baza bilan ulanishda xato.", 0
+    try:
+        cursor = conn.cursor()
+        changed, last_id = 0, 0
+        while True:
+            cursor.execute(f"SELECT p.id FROM products p WHERE {where} AND p.id > %s ORDER BY p.id LIMIT %s", where_params + [last_id, chunk_size])
+            ids = [row[0] for row in cursor.fetchall()]
+            if not ids: break
+            # Har bir bo'lak alohida qisqa tranzaksiya: avval tarix, so'ng bitta UPDATE
+            chunk_where = f"{where} AND p.id BETWEEN %s AND %s AND {expr} <> p.price"
+            chunk_params = where_params + [ids[0], ids[-1]] + expr_params
+            cursor.execute(f"INSERT INTO price_history (product_id, old_price, new_price, user_id, reason) SELECT p.id, p.price, {expr}, %s, %s FROM products p WHERE {chunk_where}",
+                           expr_params + [user_id, reason] + chunk_params)
+            cursor.execute(f"INSERT INTO catalog_changes (entity, entity_id) SELECT 'product', p.id FROM products p WHERE {chunk_where}", chunk_params)
+            cursor.execute(f"UPDATE products p SET p.price = {expr} WHERE {chunk_where}", expr_params + chunk_params)
+            changed += cursor.rowcount
+            conn.commit()
+            last_id = ids[-1]
+        return True, f"{changed} ta mahsulot narxi o'zgartirildi.", changed
+    except mysql.connector.Error as e:
+        conn.rollback()
+        return False, str(e), 0
     finally:
         if conn: conn.close()
 
@@ -385,17 +1285,26 @@ def delete_product(product_id):
     if not conn: return False
     try:
         cursor = conn.cursor()
-        # Haqiqiy o'chirish
+        # Haqiqiy o'chirish: joylashuvlardagi qoldiq qatorlari ham (aks holda katalog va joylashuv sahifalarida qolib ketadi)
+        cursor.execute("DELETE FROM location_stock WHERE product_id = %s", (product_id,))
         cursor.execute("DELETE FROM products WHERE id = %s", (product_id,))
-        conn.commit()
-        return cursor.rowcount > 0
+        deleted = cursor.rowcount > 0
+        if deleted:
+            _log_catalog_change(cursor, 'product', product_id)
+            conn.commit()
+        else:
+            conn.rollback()
+        _invalidate_count_cache('products')
+        return deleted
     except mysql.connector.Error as e:
+        conn.rollback()
         print(f"Error deleting product: {e}")
         return False
     finally:
         if conn: conn.close()
 
 def get_low_stock_products(threshold=10):
+    _maybe_refresh_stock_totals()
     conn = connect_db()
     if not conn: return []
     try:
@@ -410,7 +1319,8 @@ def get_sales_report(start_date, end_date):
     if not conn: return [], 0, 0
     try:
         cursor = conn.cursor(dictionary=True)
-        query = "SELECT s.id as sale_id, s.sale_date, p.name, s.quantity, p.price, s.profit, (s.quantity * p.price) AS total_price FROM sales s JOIN products p ON s.product_id = p.id WHERE s.sale_date BETWEEN %s AND %s ORDER BY s.sale_date DESC"
+        # Sotuv paytidagi narx va chegirma (P&L va analitika bilan bir xil tushum)
+        query = f"SELECT s.id as sale_id, s.sale_date, p.name, s.quantity, s.unit_price AS price, s.discount, s.profit, ({SALE_REVENUE_SQL}) AS total_price FROM sales s JOIN products p ON s.product_id = p.id WHERE s.sale_date BETWEEN %s AND %s ORDER BY s.sale_date DESC"
         cursor.execute(query, (start_date, end_date))
         sales_data = cursor.fetchall()
         total_revenue = sum(s['total_price'] for s in sales_data)
@@ -424,13 +1334,20 @@ def delete_sale_record(sale_id):
     if not conn: return False
     try:
         cursor = conn.cursor()
+        cursor.execute("SELECT sale_date, product_id, quantity FROM sales WHERE id = %s", (sale_id,))
+        sale = cursor.fetchone()
+        if not sale: return False
         cursor.execute("DELETE FROM sales WHERE id = %s", (sale_id,))
+        _invalidate_pnl_periods(cursor, sale[0])
         conn.commit()
-        return cursor.rowcount > 0
+        _notify_sale(sale[1], -sale[2], _to_date(sale[0]))
+        return True
     finally:
         if conn: conn.close()
 
 def generate_qr_code_base64(data):
+    import io
+    import qrcode
     qr = qrcode.QRCode(version=1, box_size=10, border=5)
     qr.add_data(data)
     qr.make(fit=True)
@@ -451,25 +1368,115 @@ def get_most_sold_products(days=30, limit=5):
     finally:
         if conn: conn.close()
 
-def generate_automated_order_list():
+def generate_automated_order_list(top_sellers=None):
     recommendations = {}
     low_stock_items = get_low_stock_products(threshold=10)
     for item in low_stock_items:
         if item['id'] not in recommendations:
             recommendations[item['id']] = {'id': item['id'], 'name': item['name'], 'quantity': item['quantity'], 'reason': 'Qoldiq kam', 'recommended_order': 20 - item['quantity']}
-    top_sellers = get_most_sold_products(days=30, limit=10)
+    if top_sellers is None:
+        top_sellers = get_most_sold_products(days=30, limit=10)
     for item in top_sellers:
         if item['id'] not in recommendations and item['quantity'] < 25:
             recommendations[item['id']] = {'id': item['id'], 'name': item['name'], 'quantity': item['quantity'], 'reason': 'Ko\'p sotilgan', 'recommended_order': 30 - item['quantity']}
     return list(recommendations.values())
 
+# --- Bestseller hisoblagichlari (kunlik Space-Saving eskizlari) ---
+def get_products_by_ids(product_ids):
+    if not product_ids: return []
+    conn = connect_db()
+    if not conn: return []
+    try:
+        cursor = conn.cursor(dictionary=True)
+        placeholders = ", ".join(["%s"] * len(product_ids))
+        cursor.execute(f"SELECT id, name, quantity, is_active FROM products WHERE id IN ({placeholders})", tuple(product_ids))
+        return cursor.fetchall()
+    finally:
+        if conn: conn.close()
+
+def get_bestseller_counts(since_day):
+    conn = connect_db()
+    if not conn: return None
+    try:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute("SELECT day, product_id, sold FROM bestseller_counts WHERE day >= %s", (since_day,))
+        return cursor.fetchall()
+    finally:
+        if conn: conn.close()
+
+def _trim_bestseller_counts(cursor, days, capacity):
+    # Har bir kun uchun faqat eng ko'p sotilgan `capacity` ta hisoblagich qoladi
+    for day in days:
+        cursor.execute("DELETE FROM bestseller_counts WHERE day = %s AND sold <= 0", (day,))
+        cursor.execute("""
+            DELETE b FROM bestseller_counts b JOIN (
+                SELECT product_id, ROW_NUMBER() OVER (ORDER BY sold DESC, product_id) AS rn FROM bestseller_counts WHERE day = %s
+            ) r ON r.product_id = b.product_id
+            WHERE b.day = %s AND r.rn > %s""", (day, day, capacity))
+
+def add_bestseller_counts(counts, capacity):
+    rows = [(day, product_id, quantity) for day, products in counts.items() for product_id, quantity in products.items()]
+    if not rows: return True
+    conn = connect_db()
+    if not conn: return False
+    try:
+        cursor = conn.cursor()
+        cursor.executemany("INSERT INTO bestseller_counts (day, product_id, sold) VALUES (%s, %s, %s) ON DUPLICATE KEY UPDATE sold = sold + VALUES(sold)", rows)
+        _trim_bestseller_counts(cursor, counts.keys(), capacity)
+        conn.commit()
+        return True
+    except mysql.connector.Error as e:
+        conn.rollback()
+        print(f"Error saving bestseller counts: {e}")
+        return False
+    finally:
+        if conn: conn.close()
+
+def prune_bestseller_counts(before_day):
+    conn = connect_db()
+    if not conn: return False
+    try:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM bestseller_counts WHERE day < %s", (before_day,))
+        conn.commit()
+        return True
+    except mysql.connector.Error as e:
+        conn.rollback()
+        print(f"Error pruning bestseller counts: {e}")
+        return False
+    finally:
+        if conn: conn.close()
+
+def rebuild_bestseller_counts(days, capacity):
+    conn = connect_db()
+    if not conn: return False
+    try:
+        cursor = conn.cursor()
+        since_day = date.today() - timedelta(days=days)
+        cursor.execute("DELETE FROM bestseller_counts")
+        cursor.execute("""
+            INSERT INTO bestseller_counts (day, product_id, sold)
+            SELECT day, product_id, sold FROM (
+                SELECT DATE(sale_date) AS day, product_id, SUM(quantity) AS sold,
+                       ROW_NUMBER() OVER (PARTITION BY DATE(sale_date) ORDER BY SUM(quantity) DESC, product_id) AS rn
+                FROM sales WHERE sale_date >= %s GROUP BY DATE(sale_date), product_id
+            ) t WHERE rn <= %s""", (since_day, capacity))
+        conn.commit()
+        return True
+    except mysql.connector.Error as e:
+        conn.rollback()
+        print(f"Error rebuilding bestseller counts: {e}")
+        return False
+    finally:
+        if conn: conn.close()
+
 def get_cashier_performance_stats(days=30):
     conn = connect_db()
     if not conn: return []
     try:
         cursor = conn.cursor(dictionary=True)
         date_limit = datetime.now() - timedelta(days=days)
-        query = "SELECT u.id as user_id, u.username, COUNT(s.id) as transaction_count, SUM(s.quantity) as total_items_sold, SUM(s.quantity * p.price) as total_sales_amount FROM sales s JOIN users u ON s.user_id = u.id JOIN products p ON s.product_id = p.id WHERE s.sale_date >= %s AND u.role = 'cashier' GROUP BY u.id, u.username ORDER BY total_sales_amount DESC"
+        query = f"SELECT u.id as user_id, u.username, COUNT(s.id) as transaction_count, SUM(s.quantity) as total_items_sold, SUM({SALE_REVENUE_SQL}) as total_sales_amount FROM sales s JOIN users u ON s.user_id = u.id WHERE s.sale_date >= %s AND u.role = 'cashier' GROUP BY u.id, u.username ORDER BY total_sales_amount DESC"
         cursor.execute(query, (date_limit,))
         return cursor.fetchall()
     finally:
@@ -0,0 +1,24 @@
+# gunicorn.conf.py
+# Ishga tushirish: gunicorn -c gunicorn.conf.py wsgi:app
+
+import multiprocessing
+import os
+
+bind = os.environ.get('SAVDOGAR_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('SAVDOGAR_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+preload_app = True
+
+def on_starting(server):
+    # Oldingi ishga tushirishdan qolgan worker metrikalari fayllari tozalanadi
+    import metrics
+    from app import app
+    metrics.clear_multiprocess_dir()
+
+def when_ready(server):
+    import boot
+    from app import app
+    boot.preload(app)
+
+def pre_fork(server, worker):
+    import boot
+    boot.prepare_for_fork()
@@ -0,0 +1,27 @@
+# jobs.py
+# Davriy fon vazifalari (cron orqali ishga tushiriladi), masalan:
+#   */5 * * * *  cd /srv/savdogar && python jobs.py compact_loyalty
+#   30 3 * * *   cd /srv/savdogar && python jobs.py expire_loyalty
+# Vazifalar GET_LOCK bilan himoyalangan: bir vaqtda ikki nusxa ishga tushsa ham xavfsiz.
+
+import sys
+
+import db_functions as db
+
+JOBS = {
+    'compact_loyalty': db.compact_loyalty_balances,
+    'expire_loyalty': db.expire_loyalty_points,
+}
+
+def run(names):
+    for name in names:
+        result = JOBS[name]()
+        print(f"{name}: {result}")
+
+if __name__ == '__main__':
+    names = sys.argv[1:] or list(JOBS)
+    unknown = [name for name in names if name not in JOBS]
+    if unknown:
+        print(f"Noma'lum vazifa: {', '.join(unknown)}. Mavjudlari: {', '.join(JOBS)}")
+        sys.exit(2)
+    run(names)
@@ -0,0 +1,257 @@
+# metrics.py
+# So'rovlar kechikishi: endpoint va bosqichlar (auth, db, render, serialize, session) bo'yicha
+# histogrammalar, Server-Timing sarlavhasi va Prometheus formatidagi /metrics.
+# Har bir worker o'z hisoblagichlarini umumiy katalogdagi alohida faylga yozadi; /metrics ularni jamlaydi.
+
+import atexit
+import bisect
+import glob
+import hmac
+import inspect
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import g, has_app_context, request, Response, before_render_template, template_rendered
+from flask.json.provider import DefaultJSONProvider
+
+# Faqat shu ulushdagi so'rovlar bosqichlarga bo'lib o'lchanadi (1.0 - hammasi)
+SAMPLE_RATE = float(os.environ.get('SAVDOGAR_METRICS_SAMPLE_RATE', '0.1'))
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PHASES = ('auth', 'db', 'render', 'serialize', 'session')
+
+# Jarayon fayli shu soniyadan ko'p bo'lmagan kechikish bilan yangilanadi
+FLUSH_SECONDS = 1.0
+
+_lock = threading.Lock()
+_flush_lock = threading.Lock()
+_histograms = {}
+_requests_total = {}
+_metrics_dir = None
+_process_file = None
+_flushed_at = 0.0
+
+def observe(endpoint, phase, seconds):
+    index = bisect.bisect_left(BUCKETS, seconds)
+    with _lock:
+        histogram = _histograms.get((endpoint, phase))
+        if histogram is None:
+            histogram = _histograms[(endpoint, phase)] = [[0] * (len(BUCKETS) + 1), 0.0, 0]
+        histogram[0][index] += 1
+        histogram[1] += seconds
+        histogram[2] += 1
+
+def _timings():
+    return g.get('_metrics_timings') if has_app_context() else None
+
+def _add_exclusive(timings, name, start, inner_before):
+    # Bosqichlar kesishmaydi: ichida o'lchangan boshqa bosqichlar (masalan, auth ichidagi db) vaqti ayiriladi,
+    # shuning uchun Server-Timing bosqichlari yig'indisi umumiy vaqtdan oshmaydi
+    inner = sum(timings.values()) - inner_before
+    timings[name] = timings.get(name, 0.0) + max(time.perf_counter() - start - inner, 0.0)
+
+@contextmanager
+def phase(name):
+    timings = _timings()
+    if timings is None:
+        yield
+        return
+    start, inner_before = time.perf_counter(), sum(timings.values())
+    try:
+        yield
+    finally:
+        _add_exclusive(timings, name, start, inner_before)
+
+def instrument_module(module, phase_name='db'):
+    # Modulning ochiq funksiyalari o'raladi; ichma-ich chaqiruvlar faqat bir marta hisoblanadi
+    def wrap(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            timings = _timings()
+            if timings is None or g.get('_metrics_depth'):
+                return func(*args, **kwargs)
+            g._metrics_depth = 1
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                g._metrics_depth = 0
+                timings[phase_name] = timings.get(phase_name, 0.0) + time.perf_counter() - start
+        return wrapper
+
+    for name, obj in list(vars(module).items()):
+        if inspect.isfunction(obj) and obj.__module__ == module.__name__ and not name.startswith('_'):
+            setattr(module, name, wrap(obj))
+
+class TimedJSONProvider(DefaultJSONProvider):
+    def response(self, *args, **kwargs):
+        with phase('serialize'):
+            return super().response(*args, **kwargs)
+
+def _render_started(sender, template, context, **extra):
+    if _timings() is not None:
+        g._metrics_render_stack = g.get('_metrics_render_stack', []) + [(time.perf_counter(), sum(g._metrics_timings.values()))]
+
+def _render_finished(sender, template, context, **extra):
+    timings = _timings()
+    stack = g.get('_metrics_render_stack') if timings is not None else None
+    if stack:
+        start, inner_before = stack.pop()
+        # Ichki shablonlar (include/fragment) tashqi shablon vaqtiga kirgan
+        if not stack:
+            _add_exclusive(timings, 'render', start, inner_before)
+
+def _server_timing(timings, total):
+    parts = [f"{name};dur={timings[name] * 1000:.1f}" for name in PHASES if name in timings]
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+def _snapshot():
+    with _lock:
+        return {
+            'requests': [[*key, count] for key, count in _requests_total.items()],
+            'histograms': [[*key, list(value[0]), value[1], value[2]] for key, value in _histograms.items()],
+        }
+
+def _own_file():
+    # Fayl nomida pid va jarayon boshlanish vaqti: qayta ishlatilgan pid o'lgan workerning faylini bosib ketmaydi
+    global _process_file
+    if _process_file is None or _process_file[0] != os.getpid():
+        _process_file = (os.getpid(), os.path.join(_metrics_dir, f"worker-{os.getpid()}-{time.time_ns()}.json"))
+    return _process_file[1]
+
+def flush(force=False):
+    global _flushed_at
+    if _metrics_dir is None:
+        return
+    now = time.monotonic()
+    if not force and now - _flushed_at < FLUSH_SECONDS:
+        return
+    if not _flush_lock.acquire(blocking=force):
+        return
+    try:
+        _flushed_at = now
+        path = _own_file()
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(_snapshot(), f)
+        os.replace(tmp_path, path)
+    finally:
+        _flush_lock.release()
+
+def clear_multiprocess_dir():
+    # Server ishga tushganda (workerlar yaratilishidan oldin) bir marta chaqiriladi
+    if _metrics_dir is None:
+        return
+    for path in glob.glob(os.path.join(_metrics_dir, 'worker-*.json*')):
+        os.remove(path)
+
+def _collect():
+    # Barcha workerlar (o'lganlari ham - hisoblagichlar kamaymasligi uchun) fayllari yig'indisi
+    if _metrics_dir is None:
+        snapshots = [_snapshot()]
+    else:
+        flush(force=True)
+        snapshots = []
+        for path in glob.glob(os.path.join(_metrics_dir, 'worker-*.json')):
+            try:
+                with open(path) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+    requests_total, histograms = {}, {}
+    for snapshot in snapshots:
+        for endpoint, method, status, count in snapshot['requests']:
+            key = (endpoint, method, status)
+            requests_total[key] = requests_total.get(key, 0) + count
+        for endpoint, phase_name, counts, total_sum, count in snapshot['histograms']:
+            merged = histograms.get((endpoint, phase_name))
+            if merged is None:
+                histograms[(endpoint, phase_name)] = (list(counts), total_sum, count)
+            else:
+                histograms[(endpoint, phase_name)] = ([a + b for a, b in zip(merged[0], counts)], merged[1] + total_sum, merged[2] + count)
+    return requests_total, histograms
+
+def render_prometheus():
+    lines = [
+        "# HELP savdogar_http_requests_total HTTP so'rovlar soni.",
+        "# TYPE savdogar_http_requests_total counter",
+    ]
+    requests_total, histograms = _collect()
+    for (endpoint, method, status), count in sorted(requests_total.items()):
+        lines.append(f'savdogar_http_requests_total{{endpoint="{endpoint}",method="{method}",status="{status}"}} {count}')
+    lines.append("# HELP savdogar_http_request_duration_seconds Tanlangan so'rovlar kechikishi bosqichlar bo'yicha.")
+    lines.append("# TYPE savdogar_http_request_duration_seconds histogram")
+    for (endpoint, phase_name), (counts, total_sum, count) in sorted(histograms.items()):
+        labels = f'endpoint="{endpoint}",phase="{phase_name}"'
+        cumulative = 0
+        for bound, bucket_count in zip(BUCKETS, counts):
+            cumulative += bucket_count
+            lines.append(f'savdogar_http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'savdogar_http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {count}')
+        lines.append(f'savdogar_http_request_duration_seconds_sum{{{labels}}} {total_sum:.6f}')
+        lines.append(f'savdogar_http_request_duration_seconds_count{{{labels}}} {count}')
+    return "\n".join(lines) + "\n"
+
+def metrics_view():
+    # Token majburiy: teskari proksi ortida remote_addr har doim 127.0.0.1 bo'ladi
+    token = os.environ.get('SAVDOGAR_METRICS_TOKEN')
+    if not token or not hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {token}"):
+        return Response("Forbidden\n", status=403, mimetype='text/plain')
+    return Response(render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+def init_app(app, metrics_dir=None):
+    global _metrics_dir
+    _metrics_dir = metrics_dir or os.environ.get('SAVDOGAR_METRICS_DIR') or os.path.join(app.instance_path, 'metrics')
+    os.makedirs(_metrics_dir, exist_ok=True)
+    atexit.register(flush, force=True)
+    interface = app.session_interface
+    open_session, save_session = interface.open_session, interface.save_session
+
+    # Sessiya ochilishi before_request'dan oldin bo'ladi, shuning uchun o'lchash shu yerda boshlanadi
+    def timed_open_session(app_, request_):
+        g._metrics_start = time.perf_counter()
+        g._metrics_timings = {} if random.random() < SAMPLE_RATE else None
+        with phase('session'):
+            return open_session(app_, request_)
+
+    def timed_save_session(app_, session_, response):
+        with phase('session'):
+            return save_session(app_, session_, response)
+
+    interface.open_session = timed_open_session
+    interface.save_session = timed_save_session
+    app.json = TimedJSONProvider(app)
+    before_render_template.connect(_render_started, app)
+    template_rendered.connect(_render_finished, app)
+
+    @app.after_request
+    def add_server_timing(response):
+        g._metrics_status = response.status_code
+        timings = _timings()
+        if timings is not None:
+            response.headers['Server-Timing'] = _server_timing(timings, time.perf_counter() - g._metrics_start)
+        return response
+
+    @app.teardown_request
+    def record_metrics(exc):
+        start = g.get('_metrics_start')
+        if start is None:
+            return
+        endpoint = request.endpoint or 'unknown'
+        status = g.get('_metrics_status', 500)
+        with _lock:
+            key = (endpoint, request.method, status)
+            _requests_total[key] = _requests_total.get(key, 0) + 1
+        timings = _timings()
+        if timings is not None:
+            observe(endpoint, 'total', time.perf_counter() - start)
+            for name, seconds in timings.items():
+                observe(endpoint, name, seconds)
+        flush()
+
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
@@ -0,0 +1,65 @@
+# migrate.py
+# Baza sxemasi o'zgarishlari: migrations/ ichidagi fayllar nomi tartibida, har biri faqat bir marta qo'llanadi.
+# Ishga tushirish: python migrate.py  (holatni ko'rish: python migrate.py --status)
+
+import os
+import sys
+
+import mysql.connector
+
+import db_functions as db
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+# Eski yagona schema.sql qisman qo'llangan bazalarda: ustun/indeks allaqachon bor - qadam bajarilgan deb hisoblanadi
+ALREADY_APPLIED_ERRORS = (
+    1060,  # ER_DUP_FIELDNAME
+    1061,  # ER_DUP_KEYNAME
+)
+
+def _statements(sql):
+    lines = [line for line in sql.splitlines() if not line.strip().startswith('--')]
+    return [statement.strip() for statement in "\n".join(lines).split(';') if statement.strip()]
+
+def _applied(cursor):
+    cursor.execute("CREATE TABLE IF NOT EXISTS schema_migrations (name VARCHAR(255) PRIMARY KEY, applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP)")
+    cursor.execute("SELECT name FROM schema_migrations")
+    return {row[0] for row in cursor.fetchall()}
+
+def pending_migrations(cursor):
+    applied = _applied(cursor)
+    return [name for name in sorted(os.listdir(MIGRATIONS_DIR)) if name.endswith('.sql') and name not in applied]
+
+def migrate():
+    conn = db.connect_db()
+    if not conn: return False
+    try:
+        cursor = conn.cursor()
+        for name in pending_migrations(cursor):
+            with open(os.path.join(MIGRATIONS_DIR, name), encoding='utf-8') as f:
+                statements = _statements(f.read())
+            for statement in statements:
+                try:
+                    cursor.execute(statement)
+                except mysql.connector.Error as e:
+                    if e.errno not in ALREADY_APPLIED_ERRORS:
+                        conn.rollback()
+                        print(f"❌ {name}: {e}")
+                        return False
+            cursor.execute("INSERT INTO schema_migrations (name) VALUES (%s)", (name,))
+            conn.commit()
+            print(f"✅ {name}")
+        return True
+    finally:
+        if conn: conn.close()
+
+if __name__ == '__main__':
+    if '--status' in sys.argv:
+        conn = db.connect_db()
+        if not conn: sys.exit(1)
+        try:
+            pending = pending_migrations(conn.cursor())
+            print("\n".join(pending) if pending else "Barcha migratsiyalar qo'llangan.")
+        finally:
+            conn.close()
+    else:
+        sys.exit(0 if migrate() else 1)
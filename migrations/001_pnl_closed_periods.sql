@@ -0,0 +1,13 @@
+-- migrations/001_pnl_closed_periods.sql
+-- Foyda va Zarar: to'liq yopilgan davrlarning muzlatilgan natijalari
+CREATE TABLE IF NOT EXISTS pnl_closed_periods (
+    granularity ENUM('day', 'week', 'month', 'year') NOT NULL,
+    period_start DATE NOT NULL,
+    revenue DECIMAL(16, 2) NOT NULL DEFAULT 0,
+    cogs DECIMAL(16, 2) NOT NULL DEFAULT 0,
+    expenses DECIMAL(16, 2) NOT NULL DEFAULT 0,
+    frozen_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (granularity, period_start)
+);
+CREATE INDEX idx_sales_sale_date ON sales (sale_date);
+CREATE INDEX idx_expenses_expense_date ON expenses (expense_date);
@@ -0,0 +1,25 @@
+-- migrations/002_loyalty_ledger.sql
+-- Sodiqlik ballari: faqat qo'shiladigan jurnal va siqilgan balanslar
+CREATE TABLE IF NOT EXISTS loyalty_ledger (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    customer_id INT NOT NULL,
+    entry_type ENUM('earn', 'redeem', 'adjust', 'expire') NOT NULL,
+    points INT NOT NULL,
+    sale_id INT NULL,
+    user_id INT NULL,
+    notes VARCHAR(255) NOT NULL DEFAULT '',
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_loyalty_customer (customer_id, id),
+    INDEX idx_loyalty_created (created_at)
+);
+CREATE TABLE IF NOT EXISTS loyalty_balances (
+    customer_id INT PRIMARY KEY,
+    balance INT NOT NULL DEFAULT 0,
+    last_entry_id BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
+-- Mavjud customers.bonus_points qiymatlarini jurnalga boshlang'ich qoldiq sifatida ko'chirish (faqat bir marta)
+INSERT INTO loyalty_ledger (customer_id, entry_type, points, notes)
+SELECT c.id, 'adjust', c.bonus_points, 'Boshlang''ich qoldiq' FROM customers c
+WHERE c.bonus_points > 0
+  AND NOT EXISTS (SELECT 1 FROM loyalty_ledger l WHERE l.customer_id = c.id AND l.notes = 'Boshlang''ich qoldiq');
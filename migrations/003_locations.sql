@@ -0,0 +1,41 @@
+-- migrations/003_locations.sql
+-- Joylashuvlar (do'kon/ombor) bo'yicha qoldiq
+CREATE TABLE IF NOT EXISTS locations (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    name VARCHAR(100) NOT NULL UNIQUE,
+    location_type ENUM('store', 'warehouse') NOT NULL DEFAULT 'store',
+    is_active BOOLEAN NOT NULL DEFAULT TRUE
+);
+INSERT IGNORE INTO locations (id, name, location_type) VALUES (1, 'Asosiy do''kon', 'store'), (2, 'Asosiy ombor', 'warehouse');
+CREATE TABLE IF NOT EXISTS location_stock (
+    location_id INT NOT NULL,
+    product_id INT NOT NULL,
+    quantity INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (location_id, product_id),
+    INDEX idx_location_stock_product (product_id)
+);
+-- Mavjud qoldiq asosiy do'konga o'tkaziladi
+INSERT IGNORE INTO location_stock (location_id, product_id, quantity) SELECT 1, id, quantity FROM products;
+ALTER TABLE inventory_movements ADD COLUMN location_id INT NULL;
+ALTER TABLE sales ADD COLUMN location_id INT NULL;
+ALTER TABLE users ADD COLUMN location_id INT NULL;
+CREATE TABLE IF NOT EXISTS stock_transfers (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    from_location_id INT NOT NULL,
+    to_location_id INT NOT NULL,
+    user_id INT NULL,
+    notes VARCHAR(255) NOT NULL DEFAULT '',
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS stock_transfer_items (
+    transfer_id INT NOT NULL,
+    product_id INT NOT NULL,
+    quantity INT NOT NULL,
+    PRIMARY KEY (transfer_id, product_id)
+);
+-- Fon jarayonlari uchun "qayergacha qayta ishlangan" belgilari
+CREATE TABLE IF NOT EXISTS sync_watermarks (
+    name VARCHAR(64) PRIMARY KEY,
+    last_id BIGINT NOT NULL DEFAULT 0
+);
+INSERT IGNORE INTO sync_watermarks (name, last_id) SELECT 'stock_totals', COALESCE(MAX(id), 0) FROM inventory_movements;
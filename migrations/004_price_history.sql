@@ -0,0 +1,12 @@
+-- migrations/004_price_history.sql
+-- Narxlar tarixi (tahrirlash va ommaviy o'zgartirish)
+CREATE TABLE IF NOT EXISTS price_history (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    product_id INT NOT NULL,
+    old_price DECIMAL(12, 2) NOT NULL,
+    new_price DECIMAL(12, 2) NOT NULL,
+    user_id INT NULL,
+    reason VARCHAR(255) NOT NULL DEFAULT '',
+    changed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_price_history_product (product_id, changed_at)
+);
@@ -0,0 +1,6 @@
+-- migrations/005_list_sort_indexes.sql
+-- Ro'yxat sahifalarida saralash (keyset) uchun indekslar
+CREATE INDEX idx_products_name ON products (name);
+CREATE INDEX idx_products_price ON products (price);
+CREATE INDEX idx_customers_name ON customers (name);
+CREATE INDEX idx_users_username_role ON users (role, username);
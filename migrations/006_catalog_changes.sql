@@ -0,0 +1,11 @@
+-- migrations/006_catalog_changes.sql
+-- Kassa terminallari uchun katalog o'zgarishlari lentasi (version - monoton o'suvchi)
+-- Eski yozuvlar davriy tozalanadi: python -c "import db_functions; db_functions.prune_catalog_changes()"
+CREATE TABLE IF NOT EXISTS catalog_changes (
+    version BIGINT AUTO_INCREMENT PRIMARY KEY,
+    entity ENUM('product', 'stock', 'customer') NOT NULL,
+    entity_id INT NOT NULL,
+    location_id INT NULL,
+    changed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_catalog_changes_changed_at (changed_at)
+);
@@ -0,0 +1,8 @@
+-- migrations/007_bestseller_counts.sql
+-- Kunlik bestseller hisoblagichlari (har kun uchun eng ko'p sotilgan N ta mahsulot)
+CREATE TABLE IF NOT EXISTS bestseller_counts (
+    day DATE NOT NULL,
+    product_id INT NOT NULL,
+    sold INT NOT NULL,
+    PRIMARY KEY (day, product_id)
+);
@@ -0,0 +1,14 @@
+-- migrations/008_sales_unit_price.sql
+-- Sotuv vaqtidagi narx va bonus chegirmasi: tushum keyingi narx o'zgarishlariga bog'liq bo'lmasligi uchun
+ALTER TABLE sales ADD COLUMN unit_price DECIMAL(12, 2) NULL;
+ALTER TABLE sales ADD COLUMN discount DECIMAL(12, 2) NOT NULL DEFAULT 0;
+-- Eski sotuvlar uchun sotuv vaqtidagi narx saqlanmagan: joriy narx olinadi
+UPDATE sales s JOIN products p ON s.product_id = p.id SET s.unit_price = p.price WHERE s.unit_price IS NULL;
+-- Chegirma bonus jurnalidagi 'redeem' yozuvlaridan tiklanadi (1 ball = 100 so'm)
+UPDATE sales s JOIN (
+    SELECT sale_id, -SUM(points) AS points FROM loyalty_ledger WHERE entry_type = 'redeem' AND sale_id IS NOT NULL GROUP BY sale_id
+) r ON r.sale_id = s.id
+SET s.discount = LEAST(r.points * 100, s.quantity * s.unit_price)
+WHERE s.discount = 0;
+-- Muzlatilgan davrlar yangi ustunlar asosida qayta hisoblanadi
+DELETE FROM pnl_closed_periods;
@@ -0,0 +1,7 @@
+-- migrations/009_list_sort_more_indexes.sql
+-- Ro'yxatlarda saralanadigan qolgan ustunlar uchun (ustun, id) indekslari: keyset sahifa indeks bo'ylab o'qiladi
+CREATE INDEX idx_products_cost_price ON products (cost_price, id);
+CREATE INDEX idx_products_quantity ON products (quantity, id);
+CREATE INDEX idx_customers_phone_number ON customers (phone_number, id);
+-- (role, username) indeksi rol filtrisiz username bo'yicha saralashda ishlatilmaydi
+CREATE INDEX idx_users_username ON users (username, id);
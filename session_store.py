@@ -0,0 +1,198 @@
+# session_store.py
+# Server tomonidagi sessiyalar: cookie'da faqat ochiq bo'lmagan id, ma'lumotlar SQLite faylida,
+# oldida esa har bir worker uchun xotiradagi LRU kesh.
+
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+import db_functions as db
+
+SESSION_LRU_SIZE = 2048
+USER_CACHE_SIZE = 1024
+PURGE_EVERY_SAVES = 1000
+
+class LRUCache:
+    def __init__(self, size):
+        self.size = size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            if len(self._items) > self.size:
+                self._items.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._items.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+class SessionStore:
+    def __init__(self, path, lru_size=SESSION_LRU_SIZE):
+        self.path = path
+        self.marker_path = path + '.gen'
+        self.cache = LRUCache(lru_size)
+        self._saves = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS sessions (sid TEXT PRIMARY KEY, version INTEGER NOT NULL, user_id INTEGER, data TEXT NOT NULL, expires REAL NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions (expires)")
+        if not os.path.exists(self.marker_path):
+            open(self.marker_path, 'a').close()
+
+    def _connect(self):
+        # Har bir amal uchun yangi ulanish: fork'dan keyin umumiy ulanish qolmaydi
+        return sqlite3.connect(self.path, timeout=5)
+
+    def get(self, sid, version):
+        cached = self.cache.get(sid)
+        if cached and cached[0] == version and cached[2] > time.time():
+            return cached[1]
+        with self._connect() as conn:
+            row = conn.execute("SELECT version, data, expires FROM sessions WHERE sid = ? AND expires > ?", (sid, time.time())).fetchone()
+        if not row:
+            self.cache.pop(sid)
+            return None
+        data = json.loads(row[1])
+        self.cache.set(sid, (row[0], data, row[2]))
+        return data
+
+    def save(self, sid, version, data, expires):
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO sessions (sid, version, user_id, data, expires) VALUES (?, ?, ?, ?, ?)",
+                         (sid, version, data.get('user_id'), json.dumps(data), expires))
+        self.cache.set(sid, (version, data, expires))
+        self._saves += 1
+        if self._saves % PURGE_EVERY_SAVES == 0:
+            self.purge_expired()
+
+    def delete(self, sid):
+        self.cache.pop(sid)
+        with self._connect() as conn:
+            conn.execute("DELETE FROM sessions WHERE sid = ?", (sid,))
+
+    def purge_expired(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM sessions WHERE expires <= ?", (time.time(),))
+
+    # --- Boshqa workerlarga "keshlarni tozalang" signali ---
+    def bump_generation(self):
+        os.utime(self.marker_path, ns=(time.time_ns(), time.time_ns()))
+
+    def generation(self):
+        try:
+            return os.stat(self.marker_path).st_mtime_ns
+        except OSError:
+            return 0
+
+class UserCache:
+    # id -> {id, username, role, is_active, location_id}; o'zgarishlar darhol barcha workerlarga yetadi
+    def __init__(self, store, size=USER_CACHE_SIZE):
+        self.store = store
+        self.cache = LRUCache(size)
+        self._generation = store.generation()
+
+    def lookup(self, user_id):
+        # (faol foydalanuvchi yoki None, baza javob berdimi)
+        generation = self.store.generation()
+        if generation != self._generation:
+            self._generation = generation
+            self.cache.clear()
+        user = self.cache.get(user_id)
+        if user is None:
+            user = db.get_user_auth(user_id)
+            if not user:
+                # Baza javob bermadi yoki foydalanuvchi yo'q: natija keshlanmaydi, keyingi so'rovda qayta o'qiladi
+                return None, user is not False
+            self.cache.set(user_id, user)
+        return (user if user.get('is_active') else None), True
+
+    def get(self, user_id):
+        return self.lookup(user_id)[0]
+
+    def invalidate(self, user_id):
+        self.cache.pop(user_id)
+        self.store.bump_generation()
+
+class ServerSession(CallbackDict, SessionMixin):
+    def __init__(self, initial=None, sid=None, version=0, new=False):
+        def on_update(self):
+            self.modified = True
+        CallbackDict.__init__(self, initial, on_update)
+        self.sid = sid
+        self.version = version
+        self.new = new
+        self.modified = False
+
+class ServerSessionInterface(SessionInterface):
+    def __init__(self, store):
+        self.store = store
+
+    def _new_sid(self):
+        return secrets.token_urlsafe(32)
+
+    def open_session(self, app, request):
+        cookie = request.cookies.get(self.get_cookie_name(app), '')
+        sid, _, version = cookie.partition('.')
+        if sid and version.isdigit():
+            data = self.store.get(sid, int(version))
+            if data is not None:
+                return ServerSession(data, sid=sid, version=int(version))
+        return ServerSession(sid=self._new_sid(), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        if not session:
+            if session.modified and not session.new:
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+        if not session.modified:
+            return
+        session.version += 1
+        expires = time.time() + app.permanent_session_lifetime.total_seconds()
+        self.store.save(session.sid, session.version, dict(session), expires)
+        response.set_cookie(name, f"{session.sid}.{session.version}",
+                            expires=self.get_expiration_time(app, session),
+                            httponly=self.get_cookie_httponly(app),
+                            secure=self.get_cookie_secure(app),
+                            samesite=self.get_cookie_samesite(app),
+                            domain=domain, path=path)
+
+def rotate_session(session, store):
+    # Kirishda yangi id beriladi (session fixation'dan himoya)
+    if not session.new:
+        store.delete(session.sid)
+    session.sid = secrets.token_urlsafe(32)
+    session.modified = True
+
+def init_app(app, path=None):
+    path = path or os.environ.get('SAVDOGAR_SESSION_DB') or os.path.join(app.instance_path, 'sessions.sqlite3')
+    store = SessionStore(path)
+    users = UserCache(store)
+    app.session_interface = ServerSessionInterface(store)
+    db.on_user_change(users.invalidate)
+    return store, users
@@ -0,0 +1,51 @@
+# tests/test_bestsellers.py
+# Space-Saving eskizi: bazasiz tekshiriladi.
+# Ishga tushirish: python -m unittest tests.test_bestsellers
+
+import unittest
+
+from bestsellers import SpaceSaving
+
+class SpaceSavingTest(unittest.TestCase):
+    def test_counts_exactly_below_capacity(self):
+        sketch = SpaceSaving(3)
+        for item, count in ((1, 5), (2, 3), (1, 2), (3, 1)):
+            sketch.add(item, count)
+        self.assertEqual(sketch.counts, {1: 7, 2: 3, 3: 1})
+        self.assertEqual(sketch.errors, {1: 0, 2: 0, 3: 0})
+
+    def test_new_item_replaces_the_smallest_counter(self):
+        sketch = SpaceSaving(2)
+        sketch.add(1, 10)
+        sketch.add(2, 4)
+        sketch.add(3, 1)
+        # 2 chiqariladi; 3 uning qiymatini xato chegarasi sifatida oladi
+        self.assertEqual(sketch.counts, {1: 10, 3: 5})
+        self.assertEqual(sketch.errors[3], 4)
+        self.assertEqual(len(sketch.counts), sketch.capacity)
+
+    def test_counts_never_underestimate(self):
+        sketch = SpaceSaving(3)
+        true_counts = {}
+        for i in range(200):
+            item = i % 7 if i % 3 else 0
+            sketch.add(item, 1)
+            true_counts[item] = true_counts.get(item, 0) + 1
+        for item, count in sketch.counts.items():
+            self.assertGreaterEqual(count, true_counts[item])
+            self.assertLessEqual(count - sketch.errors[item], true_counts[item])
+        # Eng ko'p sotilgan mahsulot eskizda qoladi
+        self.assertIn(0, sketch.counts)
+
+    def test_negative_counts_remove_items(self):
+        sketch = SpaceSaving(2)
+        sketch.add(1, 3)
+        sketch.add(1, -3)
+        self.assertEqual(sketch.counts, {})
+        self.assertEqual(sketch.errors, {})
+        # Eskizda yo'q mahsulot uchun kamaytirish e'tiborsiz qoldiriladi
+        sketch.add(5, -2)
+        self.assertEqual(sketch.counts, {})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,161 @@
+# tests/test_db_helpers.py
+# db_functions'dagi bazasiz yordamchi funksiyalar: SQL parametrlari soni, P&L davrlari, analitika bo'lagi, sahifa kursori.
+# Ishga tushirish: python -m unittest tests.test_db_helpers
+
+import base64
+import json
+import unittest
+from datetime import date, datetime, timedelta
+from unittest import mock
+
+import db_functions as db
+
+class RecordingCursor:
+    # So'rovlarni bajarmaydi, faqat yozib oladi; har bir so'rovda %s soni parametrlar soniga teng bo'lishi shart
+    def __init__(self, results):
+        self.queries = []
+        self.results = results
+        self.rowcount = 0
+
+    def execute(self, query, params=()):
+        self.queries.append((query, list(params)))
+
+    def fetchone(self):
+        return self.results.pop(0) if self.results else None
+
+    def fetchall(self):
+        return self.results.pop(0) if self.results else []
+
+class RecordingConnection:
+    def __init__(self, results=None):
+        self.cursor_obj = RecordingCursor(results or [])
+
+    def cursor(self, dictionary=False):
+        return self.cursor_obj
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+SELECTIONS = (
+    {},
+    {'only_active': False},
+    {'name_pattern': 'choy*', 'ids': [3, 5, 8], 'margin_min': 10, 'margin_max': 40},
+)
+RULES = (
+    {'mode': 'percent', 'value': 10},
+    {'mode': 'absolute', 'value': -500, 'round_to': 100, 'round_mode': 'up'},
+    {'mode': 'target_margin', 'value': 25, 'round_to': 50},
+)
+
+class RepriceParamsTest(unittest.TestCase):
+    def assertPlaceholdersMatch(self, queries):
+        self.assertTrue(queries)
+        for query, params in queries:
+            self.assertEqual(query.count('%s'), len(params), query)
+
+    def test_selection_params(self):
+        where, params = db._reprice_selection(SELECTIONS[2])
+        self.assertEqual(where.count('%s'), len(params))
+        self.assertEqual(params, ['choy%', 3, 5, 8, 10, 40])
+        self.assertEqual(db._reprice_selection({'only_active': False}), ("TRUE", []))
+
+    def test_expression_params(self):
+        for rule in RULES:
+            expr, params = db._reprice_expression(rule)
+            self.assertEqual(expr.count('%s'), len(params), rule)
+        self.assertEqual(db._reprice_expression(RULES[1])[1], [-500, 100, 100])
+        with self.assertRaises(ValueError):
+            db._reprice_expression({'mode': 'double', 'value': 2})
+
+    def test_preview_queries(self):
+        for selection in SELECTIONS:
+            for rule in RULES:
+                conn = RecordingConnection([{'product_count': 0}, []])
+                with mock.patch.object(db, 'connect_db', return_value=conn):
+                    db.preview_bulk_reprice(selection, rule)
+                self.assertPlaceholdersMatch(conn.cursor_obj.queries)
+
+    def test_apply_queries(self):
+        for selection in SELECTIONS:
+            for rule in RULES:
+                conn = RecordingConnection([[(1,), (7,)], []])
+                with mock.patch.object(db, 'connect_db', return_value=conn):
+                    ok, _, _ = db.apply_bulk_reprice(selection, rule, user_id=1, reason="test")
+                self.assertTrue(ok)
+                queries = conn.cursor_obj.queries
+                self.assertPlaceholdersMatch(queries)
+                # Tanlov, 2 ta bo'lak yozuvi (tarix, lenta), UPDATE va keyingi bo'sh tanlov
+                self.assertEqual(len(queries), 5)
+                expr_count = len(db._reprice_expression(rule)[1])
+                where_count = len(db._reprice_selection(selection)[1])
+                self.assertEqual(queries[1][1][expr_count:expr_count + 2], [1, "test"])
+                self.assertEqual(queries[3][1][expr_count + where_count:expr_count + where_count + 2], [1, 7])
+
+class PnlPeriodsTest(unittest.TestCase):
+    def test_month_periods_are_clipped_at_both_ends(self):
+        periods = db._pnl_periods(date(2026, 1, 15), date(2026, 3, 10), 'month')
+        self.assertEqual(periods, [
+            (date(2026, 1, 15), date(2026, 2, 1), False),
+            (date(2026, 2, 1), date(2026, 3, 1), True),
+            (date(2026, 3, 1), date(2026, 3, 11), False),
+        ])
+
+    def test_aligned_range_is_all_full(self):
+        periods = db._pnl_periods(date(2026, 1, 5), date(2026, 1, 18), 'week')
+        self.assertEqual([full for _, _, full in periods], [True, True])
+        self.assertEqual(periods[-1][1], date(2026, 1, 19))
+
+    def test_periods_are_contiguous(self):
+        for granularity in db.PNL_GRANULARITIES:
+            periods = db._pnl_periods(date(2024, 2, 29), date(2026, 10, 19), granularity)
+            self.assertEqual(periods[0][0], date(2024, 2, 29))
+            self.assertEqual(periods[-1][1], date(2026, 10, 20))
+            for previous, current in zip(periods, periods[1:]):
+                self.assertEqual(previous[1], current[0], granularity)
+
+    def test_missing_runs_only_cover_unfrozen_periods(self):
+        periods = db._pnl_periods(date(2024, 1, 3), date(2026, 10, 19), 'week')
+        frozen = {start: {} for start, end, full in periods if full and end <= date(2026, 10, 1)}
+        self.assertEqual(db._pnl_missing_runs(periods, frozen), [
+            (date(2024, 1, 3), date(2024, 1, 8)),
+            (date(2026, 9, 28), date(2026, 10, 20)),
+        ])
+        self.assertEqual(db._pnl_missing_runs(periods, {}), [(periods[0][0], periods[-1][1])])
+
+class AnalyticsBucketTest(unittest.TestCase):
+    def test_picks_the_finest_bucket_within_the_point_limit(self):
+        start = datetime(2026, 1, 1)
+        self.assertEqual(db.choose_analytics_bucket(start, start + timedelta(days=2)), 'hour')
+        self.assertEqual(db.choose_analytics_bucket(start, start + timedelta(days=30)), 'day')
+        self.assertEqual(db.choose_analytics_bucket(start, start + timedelta(days=365)), 'week')
+        self.assertEqual(db.choose_analytics_bucket(start, start + timedelta(days=3000)), 'month')
+
+    def test_requested_bucket_is_coarsened_only_when_too_fine(self):
+        start = datetime(2026, 1, 1)
+        self.assertEqual(db.choose_analytics_bucket(start, start + timedelta(days=2), 'month'), 'month')
+        self.assertEqual(db.choose_analytics_bucket(start, start + timedelta(days=365), 'hour'), 'week')
+        self.assertEqual(db.choose_analytics_bucket(start, start + timedelta(days=30), 'unknown'), 'day')
+
+class PageCursorTest(unittest.TestCase):
+    def encode(self, value):
+        return base64.urlsafe_b64encode(json.dumps(value).encode()).decode().rstrip('=')
+
+    def test_round_trip(self):
+        for row, sort in (({'id': 9, 'name': "Olma"}, 'name'), ({'id': 4, 'price': 1250.5}, 'price'), ({'id': 7}, 'id')):
+            token = db._encode_page_cursor(row, sort)
+            self.assertEqual(db._decode_page_cursor(token), (row[sort], row['id']))
+
+    def test_tampered_cursors_are_rejected(self):
+        for value in ([[1], 2], [{'a': 1}, 2], ["x", [3]], ["x", "3"], [1, 2, 3], "x", None):
+            self.assertIsNone(db._decode_page_cursor(self.encode(value)), value)
+        self.assertIsNone(db._decode_page_cursor(base64.urlsafe_b64encode(b'[Infinity, 1]').decode()))
+        self.assertIsNone(db._decode_page_cursor("not-base64!"))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+# tests/test_loyalty_concurrency.py
+# Bir mijozning ballari bilan bir vaqtda ikki sotuv: ballar faqat bir marta sarflanishi kerak.
+# Haqiqiy MySQL bazasini talab qiladi: SAVDOGAR_DB_TESTS=1 python -m unittest tests.test_loyalty_concurrency
+
+import os
+import threading
+import time
+import unittest
+
+import db_functions as db
+
+@unittest.skipUnless(os.environ.get('SAVDOGAR_DB_TESTS') == '1', "SAVDOGAR_DB_TESTS=1 o'rnatilmagan")
+class ConcurrentRedemptionTest(unittest.TestCase):
+    POINTS = 50
+
+    def setUp(self):
+        self.conn = db.connect_db()
+        if not self.conn:
+            self.skipTest("Baza bilan ulanib bo'lmadi")
+        cursor = self.conn.cursor(dictionary=True)
+        cursor.execute("SELECT id FROM users ORDER BY id LIMIT 1")
+        self.user_id = cursor.fetchone()['id']
+        suffix = str(time.time_ns())
+        cursor.execute("INSERT INTO products (name, cost_price, price, quantity, is_active) VALUES (%s, 1000, 10000, 10, TRUE)", (f"test-loyalty-{suffix}",))
+        self.product_id = cursor.lastrowid
+        cursor.execute("INSERT INTO location_stock (location_id, product_id, quantity) VALUES (%s, %s, 10)", (db.DEFAULT_LOCATION_ID, self.product_id))
+        cursor.execute("INSERT INTO customers (name, phone_number) VALUES (%s, %s)", (f"test-loyalty-{suffix}", suffix[-12:]))
+        self.customer_id = cursor.lastrowid
+        cursor.execute("INSERT INTO loyalty_ledger (customer_id, entry_type, points, notes) VALUES (%s, 'adjust', %s, 'test')", (self.customer_id, self.POINTS))
+        cursor.execute("INSERT INTO loyalty_balances (customer_id, balance, last_entry_id) VALUES (%s, 0, 0)", (self.customer_id,))
+        self.conn.commit()
+
+    def tearDown(self):
+        if not self.conn:
+            return
+        cursor = self.conn.cursor()
+        cursor.execute("DELETE FROM loyalty_ledger WHERE customer_id = %s", (self.customer_id,))
+        cursor.execute("DELETE FROM loyalty_balances WHERE customer_id = %s", (self.customer_id,))
+        cursor.execute("DELETE FROM inventory_movements WHERE product_id = %s", (self.product_id,))
+        cursor.execute("DELETE FROM catalog_changes WHERE (entity = 'stock' AND entity_id = %s) OR (entity = 'customer' AND entity_id = %s)", (self.product_id, self.customer_id))
+        cursor.execute("DELETE FROM sales WHERE product_id = %s", (self.product_id,))
+        cursor.execute("DELETE FROM location_stock WHERE product_id = %s", (self.product_id,))
+        cursor.execute("DELETE FROM products WHERE id = %s", (self.product_id,))
+        cursor.execute("DELETE FROM customers WHERE id = %s", (self.customer_id,))
+        self.conn.commit()
+        self.conn.close()
+
+    def _wait_for_lock_waits(self, count, timeout=10):
+        cursor = self.conn.cursor()
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            cursor.execute("SELECT COUNT(*) FROM information_schema.innodb_trx WHERE trx_state = 'LOCK WAIT'")
+            if cursor.fetchone()[0] >= count:
+                return
+            time.sleep(0.05)
+        self.fail("Sotuvlar balans qulfini kutishga yetib kelmadi")
+
+    def test_same_points_are_not_redeemed_twice(self):
+        # Balans qatori qulflab turiladi: ikkala sotuv mahsulotni o'qib (snapshot olinadi), so'ng qulfni kutadi
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT balance FROM loyalty_balances WHERE customer_id = %s FOR UPDATE", (self.customer_id,))
+        cursor.fetchall()
+
+        results = []
+        def sell():
+            results.append(db.process_sale(self.product_id, 1, self.user_id, self.customer_id, redeem_points=self.POINTS))
+        threads = [threading.Thread(target=sell) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        self._wait_for_lock_waits(2)
+        self.conn.commit()
+        for thread in threads:
+            thread.join(timeout=30)
+
+        self.assertEqual(sum(1 for ok, _, _ in results if ok), 1, results)
+        # Ikkinchi sotuv navbat kutib ballar yetmasligini ko'rishi kerak, deadlock xatosi bilan emas
+        failed = [message for ok, message, _ in results if not ok]
+        self.assertEqual(len(failed), 1, results)
+        self.assertTrue(failed[0].startswith("Bonus ballari yetarli emas"), failed[0])
+        self.assertEqual(db.get_loyalty_balance(self.customer_id), 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,17 @@
 # wsgi.py
 from app import app
 
+try:
+    import uwsgi  # faqat uWSGI ichida mavjud
+except ImportError:
+    uwsgi = None
+
+# uWSGI (lazy-apps o'chiq) ilovani master jarayonda yuklaydi: fork'dan oldin tayyorlaymiz
+if uwsgi is not None:
+    import boot
+    import metrics
+    metrics.clear_multiprocess_dir()
+    boot.preload(app)
+
 if __name__ == "__main__":
     app.run()